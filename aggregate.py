@@ -0,0 +1,89 @@
+# per-title aggregation for the scatterplot
+#
+# the scatterplot needs one point per title: the summed imgCount and mean averageRating of the
+# selected rows, next to the title's tconst/Title/numVotes/startYear/Media. rather than running
+# a five-key groupby on every request, each row gets an integer title id at load (numbered in
+# the order groupby would sort the titles) and the title columns are kept aside once; a request
+# is then just a few np.bincount calls over the ids of the selected rows
+import numpy as np
+
+
+TITLE_KEYS = ['tconst', 'Title', 'numVotes', 'startYear', 'Media']
+
+
+# per-group sums using the same compensated (Kahan) summation as pandas' groupby mean, so the
+# means come out bit-for-bit identical. rows are added rank by rank -- every group's 1st row,
+# then every group's 2nd row, ... -- which keeps each step vectorized across all groups
+def compensated_sums(codes, values, size):
+    sums = np.zeros(size)
+    compensation = np.zeros(size)
+    if len(codes) == 0:
+        return sums
+    order = np.argsort(codes, kind='stable')
+    sorted_codes = codes[order]
+    rank = np.arange(len(order)) - np.searchsorted(sorted_codes, sorted_codes, side='left')
+    by_rank = np.argsort(rank, kind='stable')
+    bounds = np.searchsorted(rank[by_rank], np.arange(rank.max() + 2))
+    for k in range(len(bounds) - 1):
+        step = order[by_rank[bounds[k]:bounds[k+1]]]
+        groups = codes[step]
+        y = values[step] - compensation[groups]
+        t = sums[groups] + y
+        compensation[groups] = np.nan_to_num((t - sums[groups]) - y, nan=0.0)
+        sums[groups] = t
+    return sums
+
+
+# compensated_sums() for counts[i] copies of values[i] in each group i, without materializing the
+# copies: groups are sorted by count, so the ones still adding at step k are a prefix
+def repeated_sums(values, counts):
+    order = np.argsort(-counts, kind='stable')
+    values = np.asarray(values, dtype=np.float64)[order]
+    counts = counts[order]
+    sums = np.zeros(len(values))
+    compensation = np.zeros(len(values))
+    steps = int(counts.max()) if len(counts) else 0
+    active = np.searchsorted(-counts, -np.arange(steps), side='left') # groups with more than k copies
+    for k in range(steps):
+        m = active[k]
+        y = values[:m] - compensation[:m]
+        t = sums[:m] + y
+        compensation[:m] = np.nan_to_num((t - sums[:m]) - y, nan=0.0)
+        sums[:m] = t
+    out = np.zeros(len(values))
+    out[order] = sums
+    return out
+
+
+class TitleAggregator:
+    def __init__(self, df):
+        grouped = df.groupby(TITLE_KEYS, sort=True, observed=True)
+        # rows with a missing key belong to no title (groupby drops them too)
+        self.codes = grouped.ngroup().fillna(-1).to_numpy().astype(np.int64)
+        self.titles = grouped.size().reset_index()[TITLE_KEYS] # title metadata, in id order
+        self.imgCount = df['imgCount'].to_numpy()
+        self.rating = df['averageRating'].to_numpy(dtype=np.float64)
+        self.has_episode = df['Episode'].notna().to_numpy()
+
+    # same frame as resolved_df.groupby(TITLE_KEYS) aggregating averageRating by mean, Episode
+    # by count and imgCount by sum, for the rows at the given positions
+    def aggregate(self, rows):
+        codes = self.codes[rows]
+        in_title = codes >= 0
+        codes = codes[in_title]
+        rows = np.asarray(rows)[in_title]
+        size = len(self.titles)
+        present = np.flatnonzero(np.bincount(codes, minlength=size))
+        rating = self.rating[rows]
+        rated = ~np.isnan(rating)
+        rating_count = np.bincount(codes[rated], minlength=size)
+        rating_sum = compensated_sums(codes[rated], rating[rated], size)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            rating_mean = rating_sum / rating_count
+        episodes = np.bincount(codes, weights=self.has_episode[rows], minlength=size)
+        img_counts = np.bincount(codes, weights=self.imgCount[rows], minlength=size)
+        out = self.titles.iloc[present].reset_index(drop=True)
+        out['averageRating'] = rating_mean[present]
+        out['Episode'] = episodes[present].astype(np.int64)
+        out['imgCount'] = img_counts[present].astype(np.int64) # as wide as pandas sums an int64 column
+        return out
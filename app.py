@@ -1,10 +1,27 @@
 # import libraries
-from dash import Dash, html, dcc, Input, Output, callback 
-import pandas as pd
-import numpy as np
-import plotly.express as px
+import os
+import threading
+import time
+import uuid
+import plotly.io as pio
+from dash import Dash, html, dcc, Input, Output, State, callback, ctx, no_update, ClientsideFunction
+from dash.exceptions import PreventUpdate
+from flask import Response, request
 import dash_bootstrap_components as dbc
-from dash_bootstrap_templates import load_figure_template
+from cache import FigureCache
+from compression import Compressor
+from snapshot import load_data, source_stamp, current_data, default_years, CSV_PATH, SNAPSHOT_DIR
+from backends import PartitionedBackend, SQLiteBackend
+from titles import TitleSearch
+from filters import SessionMasks
+from drilldown import DrillIndex
+from metrics import Metrics
+from coalesce import Superseder
+from payload import Payload, skeletons, CATEGORICAL, NUMERIC
+from render import RenderPool
+import figures
+import downsample
+import export
 
 
 # initialize app
@@ -13,14 +30,156 @@ stylesheets = [dbc.themes.LUX, dbc_css] # load the CSS stylesheet
 app = Dash(__name__, external_stylesheets=stylesheets) # initialize the app
 server = app.server # make it work for render
 
-load_figure_template("lux")
 bootstrap_colors = ['rgb(60, 60, 60)', 'rgb(198, 91, 85)', 'rgb(104, 189, 122)', 'rgb(246, 195, 112)', 'rgb(90, 153, 203)', 
                     'rgb(111, 111, 111)', 'rgb(223, 167, 164)'] # the colors for LUX theme so I can reuse as needed
 
 
-# read CSV with data in
-df = pd.read_csv('data/data.csv', low_memory=False)
-df = df[df['startYear'] > 2019]
+# plotly express and the LUX figure template take the better part of a second to load, so they
+# are loaded when the first chart is drawn instead of at import (benchmarks/bench_startup.py)
+px = None
+plotting_lock = threading.Lock()
+
+def plotting():
+    global px
+    with plotting_lock:
+        if px is None:
+            import plotly.express
+            from dash_bootstrap_templates import load_figure_template
+            load_figure_template("lux")
+            px = plotly.express
+    return px
+
+# the first request (the page itself) starts loading them in the background, so they're ready
+# by the time the browser has fetched the page's scripts and asks for the charts. (not at
+# import: with gunicorn's preload, the workers are forked from the importing process)
+plotting_thread = None
+
+@server.before_request
+def start_plotting():
+    global plotting_thread
+    if plotting_thread is None:
+        plotting_thread = threading.Thread(target=plotting, daemon=True)
+        plotting_thread.start()
+
+
+# per-callback timings/row counts, served from /metrics when METRICS_ENABLED=1
+# (METRICS_TRACE_FILE additionally appends every callback call to that file as a JSON line)
+metrics = Metrics(
+    enabled=os.environ.get('METRICS_ENABLED', '0') == '1',
+    trace_path=os.environ.get('METRICS_TRACE_FILE')
+)
+
+# read data in. QUERY_BACKEND=pandas (the default) holds the years the charts are asked about in
+# memory, read from the year-partitioned snapshot if `python snapshot.py` has been run, otherwise
+# split from the CSV; QUERY_BACKEND=sqlite queries a SQLite file built from the CSV instead (see
+# backends.py). meta holds the dropdown options and slider ranges
+query_backend = os.environ.get('QUERY_BACKEND', 'pandas')
+
+def data_version():
+    stamp = source_stamp(CSV_PATH)
+    version = '{}-{}'.format(stamp['size'], stamp['mtime_ns'])
+    if query_backend != 'sqlite':
+        # the snapshot's build too: the CSV is replaced before its snapshot is rebuilt, and a
+        # worker reloading in between falls back to parsing the CSV into memory, so it has to
+        # reload once more when the snapshot is ready to switch to the memory-mapped years
+        version += '-{}'.format(current_data(SNAPSHOT_DIR))
+    return version
+
+# each browser session's last selection and the rows passing each of its filters, so that when
+# one widget changes only that filter is re-evaluated (filters.py); kept within
+# SESSION_MASK_MEMORY_MB per worker, and dropped after SESSION_IDLE_TIMEOUT seconds without use
+session_masks = SessionMasks(
+    budget=int(float(os.environ.get('SESSION_MASK_MEMORY_MB', 64)) * 2**20),
+    idle=float(os.environ.get('SESSION_IDLE_TIMEOUT', 600))
+)
+metrics.add_collector('session_masks', 'Filters reused from/evaluated for the session\'s last selection',
+                      session_masks.stats)
+
+def open_backend():
+    if query_backend == 'sqlite':
+        return SQLiteBackend.open(CSV_PATH)
+    return PartitionedBackend(load_data(), metrics, session_masks)
+
+loaded_version = data_version() # checked before reading, so a change mid-read is picked up next time
+backend = open_backend() # answers the filter + group + aggregate for all of the charts
+meta = backend.meta
+if isinstance(backend, PartitionedBackend):
+    metrics.add_collector('partitions', 'Years of data held in memory, and loads/evictions of them',
+                          lambda: backend.stats())
+# the title dropdown only gets the first TITLE_OPTIONS_LIMIT matches for what has been typed into it
+title_search = TitleSearch(backend.title_rows(), limit=int(os.environ.get('TITLE_OPTIONS_LIMIT', 100)))
+
+# the season/episode drill-down's tree (drilldown.py), built from the backend's per-episode
+# totals the first time it is opened (and again after a data reload)
+drill_index = None
+drill_lock = threading.Lock()
+
+def drill():
+    global drill_index
+    with drill_lock:
+        if drill_index is None:
+            drill_index = DrillIndex(backend.episode_totals(), meta['devices'])
+        return drill_index
+
+# finished figures are cached by selection; set FIGURE_CACHE_DIR to share them between workers
+figure_cache = FigureCache(
+    maxsize=int(os.environ.get('FIGURE_CACHE_SIZE', 128)),
+    ttl=float(os.environ.get('FIGURE_CACHE_TTL', 3600)),
+    directory=os.environ.get('FIGURE_CACHE_DIR'),
+    version=loaded_version,
+    metrics=metrics
+)
+metrics.add_collector('figure_cache', 'Figure cache size and hit/miss counts', figure_cache.stats)
+
+# responses are gzipped (or brotli'd, with the brotli package), and callback responses are kept
+# by an ETag of the request, so repeating an interaction doesn't even run the callback
+compressor = Compressor(
+    enabled=os.environ.get('COMPRESS_RESPONSES', '1') == '1',
+    maxsize=int(os.environ.get('RESPONSE_CACHE_SIZE', 256)),
+    version=loaded_version
+)
+metrics.add_collector('responses', 'Response cache hits and bytes before/after compression', compressor.stats)
+
+# figures (in dash's callback responses and the figure cache) are serialized with orjson when
+# it's installed, which is several times faster than the json module
+try:
+    import orjson
+    pio.json.config.default_engine = 'orjson'
+except ImportError:
+    pass
+
+# drops chart requests overtaken by a newer one from the same browser (e.g. mid slider drag);
+# SLIDER_UPDATE_MODE picks whether the sliders fire on release ('mouseup') or while dragging ('drag')
+superseder = Superseder(enabled=os.environ.get('DROP_SUPERSEDED', '1') == '1')
+slider_update_mode = os.environ.get('SLIDER_UPDATE_MODE', 'mouseup')
+
+# with CLIENTSIDE_MODE=1 the browser downloads the data once and draws the pie and line charts
+# itself (assets/clientside.js), so those two never call back to the server
+clientside_mode = os.environ.get('CLIENTSIDE_MODE', '0') == '1'
+
+# @callback for the charts which can also be drawn clientside: in clientside mode the server
+# callback is left unregistered (the function is still used for the payload's figure skeletons)
+def chart_callback(*args, **kwargs):
+    if clientside_mode:
+        return lambda function: function
+    return callback(*args, **kwargs)
+
+# FIGURE_BUILDER=fast writes the chart figures out as plain dicts (figures.py) instead of going
+# through plotly express and its validation; FIGURE_WORKERS=n renders the sibling charts of a
+# selection on n background threads (render.py). not needed in clientside mode, where the
+# scatterplot is the only chart left on the server
+fast_figures = os.environ.get('FIGURE_BUILDER', 'px') == 'fast'
+render_pool = RenderPool(workers=0 if clientside_mode else int(os.environ.get('FIGURE_WORKERS', 0)))
+metrics.add_collector('render_pool', 'Background figure renders', render_pool.stats)
+
+# the scatterplot switches to WebGL (scattergl) above SCATTER_WEBGL_THRESHOLD titles (1000, as
+# plotly express's own render_mode='auto' does), and above SCATTER_MAX_POINTS titles the points
+# drawn on top of each other are thinned out (downsample.py; 0 draws them all)
+scatter_webgl_threshold = int(os.environ.get('SCATTER_WEBGL_THRESHOLD', 1000))
+scatter_max_points = int(os.environ.get('SCATTER_MAX_POINTS', 5000))
+
+# /export streams the rows behind the current selection (export.py), EXPORT_CHUNK_ROWS at a time
+export_chunk_rows = int(os.environ.get('EXPORT_CHUNK_ROWS', 10000))
 
 
 # *************************************************************************************
@@ -45,33 +204,32 @@ instructions = html.Div([
 @callback(
         Output('title','options'),
         Input('type','value'),
-        Input('year','value')
+        Input('year','value'),
+        Input('title','search_value'),
+        State('title','value')
 )
-def title(type, year):
-    if type == None or type == []:
-        type = df['Media'].unique()
-    if year == None or year == []:
-        year = df['startYear'].unique()
-        year = [year[0], year[(len(year)-1)]]
-    return [{'label': i, 'value': i} for i in df.loc[df['Media'].isin(type) & (df['startYear'] >= year[0]) & (df['startYear'] <= year[1])]['Title'].unique()]
+@metrics.instrument('title')
+@superseder.latest_only
+def title(type, year, search_value, value):
+    # no media types/years selected means all of them
+    return title_search.options(type, year, search_value, value)
 
 title_dropdown = html.Div([
     html.Label('Specific Title (selecting none displays all)'),
-    dcc.Dropdown(id = 'title', options = df['Title'].unique(), multi = True),
+    dcc.Dropdown(id = 'title', options = title_search.options(None, None), multi = True),
     html.Br()
 ])
 
-years = np.sort(df['startYear'].unique())
-
 year_slider = html.Div([
     html.Label('Year(s)'),
     dcc.RangeSlider(
         id = 'year',
-        min = years[0], 
-        max = years[len(years)-1], 
+        updatemode = slider_update_mode,
+        min = meta['year']['min'], 
+        max = meta['year']['max'], 
         step = 1,
-        value = [years[0], years[len(years)-1]], #default values
-        marks={i: '{}'.format(i) for i in range(years[0], years[len(years)-1]+1, 1)},
+        value = default_years(meta), #default values (from DEFAULT_START_YEAR)
+        marks = meta['year']['marks'],
         allowCross=False,
     ),
     html.Br()
@@ -85,32 +243,30 @@ type_dropdown = html.Div([
 
 device_dropdown = html.Div([
     html.Label('Device'),
-    dcc.Dropdown(id = 'device', options = df['Device'].unique(), multi = True, value=df['Device'].unique()),
+    dcc.Dropdown(id = 'device', options = meta['devices'], multi = True, value=meta['devices']),
     html.Br()
 ])
 
-imgCount = np.sort(df['imgCount'].unique())
-
 imgCount_slider = html.Div([
     html.Label('Number of Apple Devices per Instance'),
     dcc.RangeSlider(
         id = 'imgCount',
-        min = imgCount[0]-1, 
-        max = imgCount[len(imgCount)-1], 
+        updatemode = slider_update_mode,
+        min = meta['imgCount']['min']-1, 
+        max = meta['imgCount']['max'], 
         step = 1,
-        value = [imgCount[0], imgCount[len(imgCount)-1]], #default values
-        marks={i: '{}'.format(i) for i in range(imgCount[0]-1, imgCount[len(imgCount)-1]+1, 10)},
+        value = [meta['imgCount']['min'], meta['imgCount']['max']], #default values
+        marks = meta['imgCount']['marks'],
         allowCross=False,
     ),
     html.Br()
 ])
 
-rating = np.sort(df['averageRating'].unique())
-
 rating_slider = html.Div([
     html.Label('Average Title Rating'),
     dcc.RangeSlider(
         id = 'rating',
+        updatemode = slider_update_mode,
         min = 0, 
         max = 10, 
         step = 0.25,
@@ -133,13 +289,39 @@ accordion = html.Div([
 ], className='card border-secondary mb-3 p-0')
 
 
+### and a download of the selected rows, in the picked format (the link follows the widgets)
+@callback(
+        Output('export-link','href'),
+        Input('title','value'),
+        Input('year','value'),
+        Input('type','value'),
+        Input('device','value'),
+        Input('imgCount','value'),
+        Input('rating','value'),
+        Input('export-format','value')
+)
+def export_link(title, year, type, device, imgCount, rating, format):
+    return app.get_relative_path('/export') + '?' + export.query(format, title, year, type, device, imgCount, rating)
+
+export_div = html.Div([
+    html.Label('Download the Selected Rows', htmlFor='export-format'),
+    dbc.RadioItems(
+        options = [{'label': export.FORMATS[name][0], 'value': name} for name in export.formats()],
+        value = 'csv',
+        inline = True,
+        id = 'export-format'
+    ),
+    html.A(dbc.Button('Download', color='primary', className='w-100'), id='export-link', href='', download='')
+])
+
 ## now, add each widget to the collection of widgets, to be added to the navBar overall
 widgets = html.Div([
     html.H3('Selections', className='card-title'),
     type_dropdown,
     year_slider,
     device_dropdown,
-    accordion
+    accordion,
+    export_div
 ], className='card-body')
 
 # and this is the final div which will be added to the layout representing the entire navbar
@@ -156,7 +338,7 @@ navBar = html.Div([
 ## First, I include the functions which actually create the graphs
 
 # creates the pie chart showing frequency of devices in titles
-@callback(
+@chart_callback(
         Output('pie-devices', 'figure'),
         Input('title','value'),
         Input('year','value'),
@@ -165,26 +347,26 @@ navBar = html.Div([
         Input('imgCount','value'),
         Input('rating','value')
 )
+@metrics.instrument('pie_devices')
+@superseder.latest_only
+@render_pool.fan_out('pie')
+@figure_cache.memoize('pie')
 def pie_devices(title, year, type, device, imgCount, rating):
-    # set defaults if not set
-    if title == None or title == []:
-        title = df['Title'].unique()
-    if type == None or type == []:
-        type = df['Media'].unique()
-    if device == None or device == []:
-        device = df['Device'].unique()
-    resolved_df = df.loc[df['Title'].isin(title) & (df['startYear'] >= year[0]) & (df['startYear'] <= year[1])
-                         & df['Media'].isin(type) & df['Device'].isin(device) & (df['imgCount'] >= imgCount[0])
-                         & (df['imgCount'] <= imgCount[1]) & (df['averageRating'] >= rating[0]) 
-                         & (df['averageRating'] <= rating[1]) ]
-    fig = px.pie(
-        resolved_df.groupby(['Device'])['Device'].count().reset_index(name='count'),
-        values='count',
-        names='Device',
-        title='Apple Products Placed in Titles by Device',
-        height=500
-    )
-    fig.update_traces(sort=False, direction='clockwise')
+    with metrics.phase('filter'):
+        device_counts = backend.device_counts(title, year, type, device, imgCount, rating)
+    superseder.check() # don't build a figure nobody will see
+    with metrics.phase('figure'):
+        plotting()
+        if fast_figures:
+            return figures.pie(device_counts, 'Apple Products Placed in Titles by Device', height=500)
+        fig = px.pie(
+            device_counts,
+            values='count',
+            names='Device',
+            title='Apple Products Placed in Titles by Device',
+            height=500
+        )
+        fig.update_traces(sort=False, direction='clockwise')
     return fig
 
 # creates scatterplot of rating vs number of product placements
@@ -197,49 +379,47 @@ def pie_devices(title, year, type, device, imgCount, rating):
         Input('imgCount','value'),
         Input('rating','value')
 )
+@metrics.instrument('scatter_ratings')
+@superseder.latest_only
+@render_pool.fan_out('scatter')
+@figure_cache.memoize('scatter')
 def scatter_ratings(title, year, type, device, imgCount, rating):
-    # set defaults if not set
-    if title == None or title == []:
-        title = df['Title'].unique()
-    if type == None or type == []:
-        type = df['Media'].unique()
-    if device == None or device == []:
-        device = df['Device'].unique()
-    resolved_df = df.loc[df['Title'].isin(title) & (df['startYear'] >= year[0]) & (df['startYear'] <= year[1])
-                         & df['Media'].isin(type) & df['Device'].isin(device) & (df['imgCount'] >= imgCount[0])
-                         & (df['imgCount'] <= imgCount[1]) & (df['averageRating'] >= rating[0]) 
-                         & (df['averageRating'] <= rating[1])]
-    same_cols = ['tconst', 'Title', 'numVotes', 'startYear','Media']
-    agg_dict = {
-        'Device':'count',
-        'averageRating':'mean',
-        'Season':'count',
-        'Episode':'count',
-        'imgCount':'sum' 
-    }
-    resolved_data = resolved_df.groupby(same_cols).agg(agg_dict).drop(columns=['Season','Device']).reset_index()
+    with metrics.phase('filter'):
+        # one row per title (tconst, Title, numVotes, startYear, Media) with the mean averageRating
+        # and summed imgCount of its selected rows
+        resolved_data = backend.title_points(title, year, type, device, imgCount, rating)
     resolved_data = resolved_data[resolved_data['imgCount'] > 1]
     resolved_data['year'] = resolved_data['startYear'].astype('string')
-    fig = px.scatter(
-        resolved_data,
-        x='imgCount',
-        y='averageRating',
-        color='year',
-        category_orders={'year': resolved_data['year'].sort_values().unique()},
-        hover_name='Title',
-        log_x=True,
-        labels={
-            'imgCount':'Number of Product Placements (logarithmic scale)',
-            'averageRating':'Average Title Rating',
-            'year':'Year'
-        },
-        title='Product Placements by Title vs Average Rating'
-    )
-    fig.update_traces(marker=dict(size=9, line=dict(width=0.5,color='DarkSlateGrey')), selector=dict(mode='markers'))
+    resolved_data = downsample.thin(resolved_data, 'imgCount', 'averageRating', 'year', scatter_max_points,
+                                    log_x=True, weight='numVotes', label='Title')
+    webgl = len(resolved_data) > scatter_webgl_threshold
+    superseder.check() # don't build a figure nobody will see
+    labels = {
+        'imgCount':'Number of Product Placements (logarithmic scale)',
+        'averageRating':'Average Title Rating',
+        'year':'Year'
+    }
+    with metrics.phase('figure'):
+        plotting()
+        if fast_figures:
+            return figures.scatter(resolved_data, 'Product Placements by Title vs Average Rating', labels, gl=webgl)
+        fig = px.scatter(
+            resolved_data,
+            x='imgCount',
+            y='averageRating',
+            color='year',
+            category_orders={'year': resolved_data['year'].sort_values().unique()},
+            hover_name='Title',
+            log_x=True,
+            render_mode='webgl' if webgl else 'svg',
+            labels=labels,
+            title='Product Placements by Title vs Average Rating'
+        )
+        fig.update_traces(marker=dict(size=9, line=dict(width=0.5,color='DarkSlateGrey')), selector=dict(mode='markers'))
     return fig
 
 # creates line chart showing number of devices in titles over time
-@callback(
+@chart_callback(
         Output('line-device-time', 'figure'),
         Input('title','value'),
         Input('year','value'),
@@ -249,50 +429,123 @@ def scatter_ratings(title, year, type, device, imgCount, rating):
         Input('rating','value'),
         Input('line_device_radio','value')
 )
+@metrics.instrument('line_device_time')
+@superseder.latest_only
+@render_pool.fan_out('line', extra=['mean'])
+@figure_cache.memoize('line')
 def line_device_time(title, year, type, device, imgCount, rating,line_device_radio):
-    # set defaults if not set
-    if title == None or title == []:
-        title = df['Title'].unique()
-    if type == None or type == []:
-        type = df['Media'].unique()
-    if device == None or device == []:
-        device = df['Device'].unique()
-    resolved_df = df.loc[df['Title'].isin(title) & (df['startYear'] >= year[0]) & (df['startYear'] <= year[1])
-                         & df['Media'].isin(type) & df['Device'].isin(device) & (df['imgCount'] >= imgCount[0])
-                         & (df['imgCount'] <= imgCount[1]) & (df['averageRating'] >= rating[0]) 
-                         & (df['averageRating'] <= rating[1])]
-    same_cols = ['startYear','Device']
-    agg_dict = {
-        'imgCount':line_device_radio, # radio button to swap this b/w count, mean, sum
-        'averageRating':'mean' 
-    }
+    # line_device_radio swaps how imgCount is aggregated b/w count, mean, sum
     if line_device_radio == 'count':
         y_axis_title = 'Titles with 1+ Device Instance in Year'
     elif line_device_radio == 'sum':
         y_axis_title = 'Total Devices in Year'
     elif line_device_radio == 'mean':
         y_axis_title = 'Avg Instances of Device per Title in Year'
-    resolved_df = resolved_df.drop(columns=['tconst','Title','numVotes','Media','Season','Episode'])
-    resolved_df = resolved_df.groupby(same_cols).agg(agg_dict).reset_index()
-    fig = px.line(
-        resolved_df,
-        x='startYear',
-        y='imgCount',
-        color='Device',
-        markers=True,
-        title='Number of Placements by Device over Time',
-        labels={
-            'imgCount':y_axis_title,
-            'startYear':'Year'
-        },
-        color_discrete_sequence=bootstrap_colors[:len(resolved_df['Device'].unique())],
-        height=420
-    )
-    fig.update_xaxes(type='category')
-    fig.update_traces(marker=dict(size=9, line=dict(width=0.5,color='DarkSlateGrey')), line=dict(width=4))
+    with metrics.phase('filter'):
+        resolved_df = backend.device_years(title, year, type, device, imgCount, rating, how=line_device_radio)
+    superseder.check() # don't build a figure nobody will see
+    labels = {
+        'imgCount':y_axis_title,
+        'startYear':'Year'
+    }
+    colors = bootstrap_colors[:len(resolved_df['Device'].unique())]
+    with metrics.phase('figure'):
+        plotting()
+        if fast_figures:
+            return figures.line(resolved_df, 'Number of Placements by Device over Time', labels, colors, height=420)
+        fig = px.line(
+            resolved_df,
+            x='startYear',
+            y='imgCount',
+            color='Device',
+            markers=True,
+            title='Number of Placements by Device over Time',
+            labels=labels,
+            color_discrete_sequence=colors,
+            height=420
+        )
+        fig.update_xaxes(type='category')
+        fig.update_traces(marker=dict(size=9, line=dict(width=0.5,color='DarkSlateGrey')), line=dict(width=4))
     return fig
 
+# drill-down from a show to its seasons, and from a season to its episodes: devices placed per
+# device, from the precomputed subtotals. the show dropdown searches the shows like the title
+# dropdown does; a season is opened by picking it or by clicking its bar
+@callback(
+        Output('drill-show','options'),
+        Input('drill-show','search_value'),
+        State('drill-show','value')
+)
+@metrics.instrument('drill_show')
+def drill_show(search_value, value):
+    return title_search.options(['Show'], None, search_value, [value] if value else None)
+
+@callback(
+        Output('drill-season','options'),
+        Output('drill-season','value'),
+        Input('drill-show','value'),
+        Input('drill-chart','clickData'),
+        State('drill-season','value')
+)
+@metrics.instrument('drill_season')
+def drill_season(show, click_data, season):
+    if ctx.triggered_id == 'drill-chart':
+        if season is not None or not click_data: # a season's episodes are as far down as it goes
+            raise PreventUpdate
+        return no_update, int(click_data['points'][0]['x'])
+    index = drill()
+    seasons = index.seasons(show or index.busiest())
+    return [{'label': 'Season {}'.format(number), 'value': number} for number in seasons], None
+
+@callback(
+        Output('drill-chart', 'figure'),
+        Output('drill-summary', 'children'),
+        Input('drill-show','value'),
+        Input('drill-season','value'),
+        Input('device','value')
+)
+@metrics.instrument('drill_down')
+def drill_down(show, season, device):
+    with metrics.phase('filter'):
+        index = drill()
+        show = show or index.busiest() # the show with the most placements until one is picked
+        summary = index.summary(show, season, device)
+        children = index.children(show, season, device)
+    if season is None:
+        title = '{}: Devices Placed by Season'.format(show)
+        labels = {'key':'Season', 'imgCount':'Devices Placed', 'rows':'Placements'}
+    else:
+        title = '{}, Season {}: Devices Placed by Episode'.format(show, season)
+        labels = {'key':'Episode', 'imgCount':'Devices Placed', 'rows':'Placements'}
+    if summary is None:
+        text = 'No seasons or episodes recorded for {}'.format(show)
+    else:
+        text = '{} placements, {} devices placed over {} {}'.format(
+            summary['rows'], summary['imgCount'], summary['children'], 'seasons' if season is None else 'episodes')
+    colors = {name: bootstrap_colors[i % len(bootstrap_colors)] for i, name in enumerate(meta['devices'])}
+    if children.empty: # a movie, or none of the selected devices
+        return figures.placeholder(title, height=420), text
+    with metrics.phase('figure'):
+        plotting()
+        if fast_figures:
+            return figures.bar(children, title, labels, meta['devices'], colors, height=420), text
+        fig = px.bar(
+            children,
+            x='key',
+            y='imgCount',
+            color='Device',
+            hover_data=['rows'],
+            title=title,
+            labels=labels,
+            category_orders={'Device': meta['devices']},
+            color_discrete_map=colors,
+            height=420
+        )
+        fig.update_xaxes(type='category')
+    return fig, text
+
 ## Second, I combine all the figures/parts in correct divs
+# (the graphs start out as empty placeholders: the callbacks draw the real charts as soon as the page loads)
 
 header_div = html.Div([
     html.H1('Apple Product Placements in Movies and TV Shows')
@@ -300,20 +553,20 @@ header_div = html.Div([
 
 pie_devices_div = html.Div([
     dcc.Graph(
-        figure = pie_devices(None, [0,0],None,None,[0,0],[0,0]), id='pie-devices'
+        figure = figures.placeholder('Apple Products Placed in Titles by Device', height=500), id='pie-devices'
     ),
 ], className='card border-secondary mr-1', style={'float':'left', 'width':'36%', 'margin-right':'1%'})
 
 scatter_ratings_div = html.Div([
     dcc.Graph(
-        figure = scatter_ratings(None, [0,0],None,None,[0,0],[0,0]), id='scatter-ratings'
+        figure = figures.placeholder('Product Placements by Title vs Average Rating'), id='scatter-ratings'
     ),
 ], className='card border-secondary mb-3')
 
 line_device_time_div = html.Div([
     html.Div([
     dcc.Graph(
-        figure = line_device_time(None, [0,0],None,None,[0,0],[0,0], 'mean'), id='line-device-time'
+        figure = figures.placeholder('Number of Placements by Device over Time', height=420), id='line-device-time'
     ),
     html.Div([
         html.Label('Select below to change grouping of the data on the y-axis of graph above',htmlFor='line_device_radio'),
@@ -336,6 +589,24 @@ line_device_time_div = html.Div([
     ])
 ], className='card border-secondary', style={'float':'right', 'width':'63%'})#f"{100*2/3-1}%"})
 
+drill_down_div = html.Div([
+    dcc.Graph(
+        figure = figures.placeholder('Devices Placed by Season', height=420), id='drill-chart'
+    ),
+    html.Div([
+        html.Div([
+            html.Label('Show', htmlFor='drill-show'),
+            dcc.Dropdown(id='drill-show', options=title_search.options(['Show'], None),
+                         placeholder='The show with the most placements')
+        ], style={'width':'48%', 'display':'inline-block', 'margin-right':'4%'}),
+        html.Div([
+            html.Label('Season (or click a season\'s bar)', htmlFor='drill-season'),
+            dcc.Dropdown(id='drill-season', placeholder='All seasons')
+        ], style={'width':'48%', 'display':'inline-block'}),
+        html.P(id='drill-summary', className='mt-2 mb-0')
+    ], style={'margin-right':'3%','margin-left':'3%'}, className='bg-light card mb-2 p-2')
+], className='card border-secondary mb-3')
+
 # then organize into rows...
 row1 = html.Div([
     pie_devices_div,
@@ -346,11 +617,16 @@ row2 = html.Div([
     scatter_ratings_div
 ], className='container row')
 
+row3 = html.Div([
+    drill_down_div
+], className='container row')
+
 # and then the main section all together
 main_div = html.Div([
     header_div,
     row1,
-    row2
+    row2,
+    row3
 ], className = 'col-lg-9')
 
 # *************************************************************************************
@@ -370,11 +646,157 @@ app.layout = dbc.Container([
             href='https://www.kaggle.com/datasets/mohammadhmozafary/apples-product-placements-in-movies-and-tv-shows', className='text-success'),
             '. See the GitHub repository with all work for this project ',html.A('here', 
             href='https://github.com/JonahZW/apple-product-placement/', className='text-success'),'.'])
-    ], className='row text-light bg-dark p-4', style={'text-align':'center'})
+    ], className='row text-light bg-dark p-4', style={'text-align':'center'}),
+    # clientside mode: polls until the browser has the data, then tells the charts it's ready
+    *([dcc.Interval(id='client-data-poll', interval=100), dcc.Store(id='client-data-ready')] if clientside_mode else [])
 ], className='dbc', fluid=True)
 
 app.title='Apple Product Placements'
 
+# pick up new data (e.g. from `python pipeline.py --append ...`) without restarting the workers.
+# every few seconds a request checks whether data/data.csv changed; if it did, the new frame,
+# indexes and layout options are built off to the side and then swapped in all at once
+reload_interval = float(os.environ.get('DATA_RELOAD_INTERVAL', 5))
+reload_lock = threading.Lock()
+last_reload_check = time.monotonic()
+
+# point the data-dependent widgets at the current dropdown options and slider ranges
+def update_widgets(meta):
+    app.layout['title'].options = title_search.options(None, None)
+    app.layout['drill-show'].options = title_search.options(['Show'], None)
+    app.layout['device'].options = meta['devices']
+    app.layout['device'].value = meta['devices']
+    app.layout['year'].min = meta['year']['min']
+    app.layout['year'].max = meta['year']['max']
+    app.layout['year'].value = default_years(meta)
+    app.layout['year'].marks = meta['year']['marks']
+    app.layout['imgCount'].min = meta['imgCount']['min']-1
+    app.layout['imgCount'].max = meta['imgCount']['max']
+    app.layout['imgCount'].value = [meta['imgCount']['min'], meta['imgCount']['max']]
+    app.layout['imgCount'].marks = meta['imgCount']['marks']
+
+def reload_data():
+    global backend, meta, title_search, drill_index, payload, loaded_version
+    with reload_lock:
+        version = data_version()
+        if version == loaded_version:
+            return False
+        new_backend = open_backend()
+        new_title_search = TitleSearch(new_backend.title_rows(), limit=title_search.limit)
+        backend, meta, title_search = new_backend, new_backend.meta, new_title_search
+        drill_index = None # rebuilt from the new data when next opened
+        loaded_version = version
+        update_widgets(meta)
+        figure_cache.set_version(version)
+        compressor.set_version(version)
+        if clientside_mode:
+            payload = build_payload() # new ETag, so browsers fetch the new data on their next load
+    return True
+
+@server.before_request
+def check_for_new_data():
+    global last_reload_check
+    now = time.monotonic()
+    if now - last_reload_check < reload_interval:
+        return
+    last_reload_check = now
+    try:
+        if data_version() != loaded_version:
+            reload_data()
+    except OSError:
+        pass # data/data.csv is being replaced right now; try again on a later request
+
+# number each callback request per browser session (a cookie set on the first page load), so
+# the superseder can tell when a request has been overtaken by a newer one for the same output,
+# and point the filter engines at that session's last selection. requests without the cookie
+# are left alone: their address may be a proxy's, shared with other users, and dropping one
+# user's request for another's newer one would leave the first user's chart stale
+@server.before_request
+def number_callback_requests():
+    callback_request = request.path.endswith('/_dash-update-component')
+    session = request.cookies.get('dash_session')
+    session_masks.use(session if callback_request else None)
+    if superseder.enabled and callback_request and session:
+        body = request.get_json(silent=True) or {}
+        superseder.register(session, body.get('output'))
+
+@server.after_request
+def set_session_cookie(response):
+    if ((superseder.enabled or session_masks.enabled) and 'dash_session' not in request.cookies
+            and response.mimetype == 'text/html'):
+        response.set_cookie('dash_session', uuid.uuid4().hex, httponly=True, samesite='Lax')
+    return response
+
+metrics.add_collector('coalescing', 'Chart requests dropped as superseded or shared with an identical one',
+                      lambda: {'superseded': superseder.dropped, 'shared': figure_cache.flights.shared})
+
+# answer repeated callback requests from the compressor's kept responses, and compress the rest
+@server.before_request
+def cached_response():
+    return compressor.cached(request)
+
+@server.after_request
+def compress_response(response):
+    return compressor.finish(request, response)
+
+# clientside mode: the compact data payload plus the callbacks which run in the browser
+def build_payload():
+    full = (None, [meta['year']['min'], meta['year']['max']], None, None, None, None) # every year
+    figures = skeletons(
+        pie_devices(*full),
+        {how: line_device_time(*full, how) for how in ['mean', 'count', 'sum']},
+        bootstrap_colors
+    )
+    return Payload(backend.frame(CATEGORICAL + NUMERIC), figures, version=loaded_version)
+
+if clientside_mode:
+    payload = build_payload()
+
+    @server.route('/placements-data.json')
+    def serve_payload():
+        return payload.response(request)
+
+    filter_inputs = [Input('title','value'), Input('year','value'), Input('type','value'),
+                     Input('device','value'), Input('imgCount','value'), Input('rating','value')]
+    app.clientside_callback(
+        ClientsideFunction(namespace='placements', function_name='poll'),
+        Output('client-data-ready', 'data'),
+        Output('client-data-poll', 'disabled'),
+        Input('client-data-poll', 'n_intervals')
+    )
+    app.clientside_callback(
+        ClientsideFunction(namespace='placements', function_name='pie'),
+        Output('pie-devices', 'figure'),
+        *filter_inputs,
+        Input('client-data-ready', 'data')
+    )
+    app.clientside_callback(
+        ClientsideFunction(namespace='placements', function_name='line'),
+        Output('line-device-time', 'figure'),
+        *filter_inputs,
+        Input('line_device_radio', 'value'),
+        Input('client-data-ready', 'data')
+    )
+
+# the rows behind a selection: the six filters as query parameters (see export.py), streamed a
+# chunk at a time from the backend as it is sent
+@server.route('/export')
+def export_rows():
+    format = request.args.get('format', 'csv')
+    try:
+        body = export.encode(backend.export(*export.filters(request.args), chunksize=export_chunk_rows), format)
+    except ValueError as error:
+        return Response(str(error) + '\n', status=400, mimetype='text/plain')
+    response = Response(body, mimetype=export.FORMATS[format][1])
+    response.headers['Content-Disposition'] = 'attachment; filename=placements.{}'.format(format)
+    return response
+
+# per-callback timings in the Prometheus text format (only when METRICS_ENABLED=1)
+if metrics.enabled:
+    @server.route('/metrics')
+    def serve_metrics():
+        return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
 # run the app!
 if __name__ == '__main__':
     app.run_server(debug=True) # comment this line when developing locally
@@ -0,0 +1,127 @@
+// clientside mode (CLIENTSIDE_MODE=1): the pie and line charts are filtered and aggregated
+// right here in the browser, from a compact copy of the data (see payload.py) downloaded once,
+// instead of a round trip to the server for every widget change. the figures mirror what
+// pie_devices and line_device_time in app.py build on the server
+(function() {
+    var placements = {
+        payload: null,
+        loading: null,
+
+        // fired by a dcc.Interval until the data has arrived; outputs the data version (which
+        // the chart callbacks listen to) and switches the interval off
+        poll: function(n_intervals) {
+            if (placements.payload !== null) {
+                return [placements.payload.version, true];
+            }
+            if (placements.loading === null) {
+                var config = JSON.parse(document.getElementById('_dash-config').textContent);
+                placements.loading = fetch(config.requests_pathname_prefix + 'placements-data.json')
+                    .then(function(response) { return response.json(); })
+                    .then(function(payload) { placements.payload = payload; })
+                    .catch(function() { placements.loading = null; }); // try again on the next tick
+            }
+            throw window.dash_clientside.PreventUpdate;
+        },
+
+        pie: function(title, year, type, device, imgCount, rating, ready) {
+            var payload = placements.payload;
+            if (payload === null) {
+                throw window.dash_clientside.PreventUpdate;
+            }
+            var rows = matching(payload.columns, title, year, type, device, imgCount, rating);
+            var devices = payload.columns.Device;
+            var counts = new Array(devices.categories.length).fill(0);
+            rows.forEach(function(row) { counts[devices.codes[row]] += 1; });
+            // categories come sorted (np.unique), so code order is the order groupby sorts in
+            var labels = [], values = [];
+            counts.forEach(function(count, code) {
+                if (count > 0) {
+                    labels.push(devices.categories[code]);
+                    values.push(count);
+                }
+            });
+            var skeleton = payload.figures.pie;
+            var trace = Object.assign({}, skeleton.trace, {labels: labels, values: values});
+            return {data: [trace], layout: skeleton.layout};
+        },
+
+        line: function(title, year, type, device, imgCount, rating, how, ready) {
+            var payload = placements.payload;
+            if (payload === null) {
+                throw window.dash_clientside.PreventUpdate;
+            }
+            var columns = payload.columns;
+            var rows = matching(columns, title, year, type, device, imgCount, rating);
+            var devices = columns.Device;
+            // (year, device) -> [row count, imgCount sum], like groupby(['startYear', 'Device'])
+            var groups = {};
+            rows.forEach(function(row) {
+                var key = columns.startYear[row] + '|' + devices.codes[row];
+                var group = groups[key] || (groups[key] = [columns.startYear[row], devices.codes[row], 0, 0]);
+                group[2] += 1;
+                group[3] += columns.imgCount[row];
+            });
+            var sorted = Object.keys(groups).map(function(key) { return groups[key]; });
+            sorted.sort(function(a, b) { return a[0] - b[0] || a[1] - b[1]; });
+            // one trace per device, in order of first appearance (which is how plotly express
+            // hands out the colors)
+            var traces = [], byDevice = {};
+            sorted.forEach(function(group) {
+                var value = how === 'count' ? group[2] : how === 'sum' ? group[3] : group[3] / group[2];
+                if (!(group[1] in byDevice)) {
+                    byDevice[group[1]] = {x: [], y: []};
+                    traces.push(group[1]);
+                }
+                byDevice[group[1]].x.push(group[0]);
+                byDevice[group[1]].y.push(value);
+            });
+            var skeleton = payload.figures.line[how];
+            var colors = payload.figures.colors.slice(0, traces.length);
+            var data = traces.map(function(code, i) {
+                var name = devices.categories[code];
+                var trace = JSON.parse(JSON.stringify(skeleton.trace).split('{device}').join(name));
+                trace.line.color = colors[i % colors.length];
+                trace.x = byDevice[code].x;
+                trace.y = byDevice[code].y;
+                return trace;
+            });
+            return {data: data, layout: skeleton.layout};
+        }
+    };
+
+    // row numbers matching the selections (same rules as filters.py: an empty dropdown means all)
+    function matching(columns, title, year, type, device, imgCount, rating) {
+        var allowed = {Title: title, Media: type, Device: device};
+        var codes = {};
+        Object.keys(allowed).forEach(function(name) {
+            var selected = allowed[name];
+            if (selected === null || selected === undefined || selected.length === 0) {
+                return;
+            }
+            var wanted = new Set(selected);
+            codes[name] = columns[name].categories.map(function(value) { return wanted.has(value); });
+        });
+        var rows = [];
+        for (var row = 0; row < columns.startYear.length; row++) {
+            if ((codes.Title && !codes.Title[columns.Title.codes[row]])
+                    || (codes.Media && !codes.Media[columns.Media.codes[row]])
+                    || (codes.Device && !codes.Device[columns.Device.codes[row]])
+                    || !within(columns.startYear[row], year)
+                    || !within(columns.imgCount[row], imgCount)
+                    || !within(columns.averageRating[row], rating)) {
+                continue;
+            }
+            rows.push(row);
+        }
+        return rows;
+    }
+
+    function within(value, range) {
+        if (range === null || range === undefined || range.length === 0) {
+            return true;
+        }
+        return value >= range[0] && value <= range[1];
+    }
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {placements: placements});
+})();
@@ -0,0 +1,394 @@
+# query backends: what answers "filter + group + aggregate" for the chart callbacks
+#
+# the callbacks ask a backend for the three aggregates they draw -- device counts (pie), per-title
+# points (scatterplot) and per-year device totals (line chart) -- for the six widget filters.
+# QUERY_BACKEND in app.py picks one:
+#   - PartitionedBackend (default): one PandasBackend per startYear -- the frame in memory,
+#     answered from the rollup cube, the filter indexes and the title aggregator -- each loaded
+#     only once a selection includes its year, and dropped again when it goes unused
+#   - SQLiteBackend: a SQLite file built from the CSV (data/placements.sqlite). the filters
+#     become the WHERE clause and the groupbys run in SQLite, so a worker only ever holds the
+#     aggregated rows, not the data. the file is built once, next to the CSV, and rebuilt when
+#     the CSV changes
+# both return the same frames (and so the same figures) for the same filters
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+from collections import OrderedDict
+from contextlib import closing
+
+import numpy as np
+import pandas as pd
+
+from filters import FilterEngine, normalize
+from rollups import RollupCube
+from aggregate import TitleAggregator, TITLE_KEYS, compensated_sums, repeated_sums
+from snapshot import SCHEMA, FORMAT, layout, source_stamp
+from drilldown import LEVELS, leaf_totals
+
+
+DB_PATH = os.environ.get('QUERY_DB', 'data/placements.sqlite')
+CHUNKSIZE = 100_000
+PARTITION_CACHE_SIZE = int(os.environ.get('PARTITION_CACHE_SIZE', 8))
+
+
+class PandasBackend:
+    def __init__(self, df, meta, metrics=None, sessions=None):
+        self.df = df
+        self.meta = meta
+        self.size = len(df)
+        self.metrics = metrics
+        # resolves the selector widgets once for all of the charts (and, with sessions, only
+        # re-evaluates the widgets each session has changed)
+        self.engine = FilterEngine(df, sessions=sessions)
+        self.cube = RollupCube(df) # pre-aggregated counts/sums for the pie and line charts
+        self.title_agg = TitleAggregator(df) # per-title sums/means for the scatterplot
+
+    def rows(self, count):
+        if self.metrics is not None:
+            self.metrics.rows(count)
+
+    # Device, count
+    def device_counts(self, *filters):
+        # answered from the rollup cube unless title/imgCount/rating are narrowed
+        device_counts = self.cube.device_counts(*filters)
+        if device_counts is None:
+            resolved_df = self.engine.resolve(*filters) # shared across the charts
+            self.rows(len(resolved_df))
+            device_counts = resolved_df.groupby(['Device'], observed=True)['Device'].count().reset_index(name='count')
+        return device_counts
+
+    # one row per title (tconst, Title, numVotes, startYear, Media) with the mean averageRating,
+    # Episode count and summed imgCount of its selected rows
+    def title_points(self, *filters):
+        rows = self.engine.rows(*filters) # shared across the charts
+        self.rows(len(rows))
+        return self.title_agg.aggregate(rows)
+
+    # startYear, Device, imgCount aggregated by `how` ('count', 'sum' or 'mean'), averageRating
+    def device_years(self, *filters, how='mean'):
+        # answered from the rollup cube unless title/imgCount/rating are narrowed
+        resolved_df = self.cube.device_years(*filters, how=how)
+        if resolved_df is None:
+            resolved_df = self.engine.resolve(*filters) # shared across the charts
+            self.rows(len(resolved_df))
+            resolved_df = resolved_df.drop(columns=['tconst','Title','numVotes','Media','Season','Episode'])
+            resolved_df = resolved_df.astype({'imgCount': 'int64'}) # sum in int64 (it's held as int32)
+            same_cols = ['startYear','Device']
+            agg_dict = {
+                'imgCount':how,
+                'averageRating':'mean'
+            }
+            resolved_df = resolved_df.groupby(same_cols, observed=True).agg(agg_dict).reset_index()
+        return resolved_df
+
+    # Title, Media, startYear rows from which TitleSearch can tell where each title first appears
+    def title_rows(self):
+        return self.df
+
+    def frame(self, columns):
+        return self.df[columns]
+
+    # the shows' per-(Title, Season, Episode, Device) rows and imgCount, for the drill-down
+    def episode_totals(self):
+        return leaf_totals(self.df)
+
+    # the selected rows (all of SCHEMA's columns), chunksize at a time
+    def export(self, *filters, chunksize=CHUNKSIZE):
+        rows = self.engine.rows(*filters)
+        for start in range(0, len(rows), chunksize):
+            yield self.df.iloc[rows[start:start + chunksize]][list(SCHEMA)]
+
+    def clear(self):
+        self.engine.clear()
+
+
+# the data split by startYear (a snapshot.SnapshotStore or FrameStore), with a PandasBackend per
+# year built the first time a selection includes that year. a selection only touches the years
+# in its range, and every title and every point of the line chart lies within a single year, so
+# the years' answers just need putting together. at most max_loaded years are kept (the least
+# recently used ones are dropped) -- a selection over more years keeps them until the next one
+class PartitionedBackend:
+    def __init__(self, store, metrics=None, sessions=None, max_loaded=PARTITION_CACHE_SIZE):
+        self.store = store
+        self.meta = store.layout
+        self.size = sum(store.rows.values())
+        self.metrics = metrics
+        self.sessions = sessions
+        self.max_loaded = max_loaded
+        self.loaded = OrderedDict() # year -> PandasBackend, least recently used first
+        self.loads = 0
+        self.evictions = 0
+        self._loading = {} # year -> lock held while it loads
+        self._lock = threading.Lock()
+        self._local = threading.local() # rows filtered for the current call, over all years
+
+    def partition(self, year):
+        with self._lock:
+            if year in self.loaded:
+                self.loaded.move_to_end(year)
+                return self.loaded[year]
+            loading = self._loading.setdefault(year, threading.Lock())
+        with loading: # one thread loads a year; the others wait for it
+            with self._lock:
+                if year in self.loaded:
+                    self.loaded.move_to_end(year)
+                    return self.loaded[year]
+            backend = PandasBackend(self.store.load(year), self.meta, metrics=self, sessions=self.sessions)
+            with self._lock:
+                self.loaded[year] = backend
+                self.loads += 1
+        return backend
+
+    # the years a year filter touches
+    def years(self, year):
+        bounds = normalize(year=year)[1]
+        return [y for y in self.store.years if bounds is None or bounds[0] <= y <= bounds[1]]
+
+    # the partitions a year filter touches. nothing in range is answered by the latest year's,
+    # which comes up empty the same way the whole frame would
+    def partitions(self, year):
+        backends = [self.partition(y) for y in self.years(year) or self.store.years[-1:]]
+        self.evict(keep=len(backends))
+        return backends
+
+    def evict(self, keep):
+        with self._lock:
+            while len(self.loaded) > max(self.max_loaded, keep):
+                self.loaded.popitem(last=False)
+                self.evictions += 1
+
+    # called by the partitions' backends; reported once for the whole call
+    def rows(self, count):
+        self._local.rows = getattr(self._local, 'rows', 0) + count
+
+    def query(self, method, filters, **kwargs):
+        self._local.rows = 0
+        parts = [getattr(backend, method)(*filters, **kwargs) for backend in self.partitions(filters[1])]
+        if self.metrics is not None and self._local.rows:
+            self.metrics.rows(self._local.rows)
+        return parts
+
+    def device_counts(self, *filters):
+        parts = self.query('device_counts', filters)
+        if len(parts) == 1:
+            return parts[0]
+        return pd.concat(parts, ignore_index=True).groupby('Device', observed=True)['count'].sum().reset_index()
+
+    def title_points(self, *filters):
+        parts = self.query('title_points', filters)
+        if len(parts) == 1:
+            return parts[0]
+        # in the order one groupby over all the years would list the titles
+        return pd.concat(parts, ignore_index=True).sort_values(TITLE_KEYS, kind='stable', ignore_index=True)
+
+    def device_years(self, *filters, how='mean'):
+        parts = self.query('device_years', filters, how=how)
+        return parts[0] if len(parts) == 1 else pd.concat(parts, ignore_index=True) # already in year order
+
+    def title_rows(self):
+        return self.store.frame(['Title', 'Media', 'startYear'])
+
+    def frame(self, columns):
+        return self.store.frame(columns)
+
+    def episode_totals(self):
+        return leaf_totals(self.store.frame(LEVELS + ['Device', 'imgCount', 'Media']))
+
+    # year by year, so only one more year has to be loaded at a time
+    def export(self, *filters, chunksize=CHUNKSIZE):
+        for year in self.years(filters[1]):
+            backend = self.partition(year)
+            self.evict(keep=1)
+            yield from backend.export(*filters, chunksize=chunksize)
+
+    def clear(self):
+        with self._lock:
+            backends = list(self.loaded.values())
+        for backend in backends:
+            backend.clear()
+
+    def stats(self):
+        return {'years': len(self.store.years), 'loaded': len(self.loaded), 'loads': self.loads,
+                'evictions': self.evictions}
+
+
+# WHERE clause (and its parameters) for the six widget filters, plus columns which must be set
+def where(filters, not_null=()):
+    title, year, type, device, imgCount, rating = normalize(*filters)
+    clauses, params = [], []
+    for column, values in [('Title', title), ('Media', type), ('Device', device)]:
+        if values is not None:
+            clauses.append('{} IN ({})'.format(column, ', '.join('?' * len(values))))
+            params += values
+    for column, bounds in [('startYear', year), ('imgCount', imgCount), ('averageRating', rating)]:
+        if bounds is not None:
+            clauses.append('{} BETWEEN ? AND ?'.format(column))
+            params += bounds
+    clauses += ['{} IS NOT NULL'.format(column) for column in not_null] # groupby drops missing keys
+    return (' WHERE ' + ' AND '.join(clauses) if clauses else ''), params
+
+
+def column(con, sql):
+    return [row[0] for row in con.execute(sql)]
+
+
+class SQLiteBackend:
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local() # one read-only connection per thread
+        meta = json.loads(self.query_value("SELECT value FROM meta WHERE key = 'meta'"))
+        self.meta = meta['layout']
+        for slider in ['year', 'imgCount']: # JSON only has string keys, but the sliders want numbers
+            self.meta[slider]['marks'] = {int(i): label for i, label in self.meta[slider]['marks'].items()}
+        self.size = meta['rows']
+
+    # the backend for csv_path, (re)building the database first if it is missing or out of date
+    @classmethod
+    def open(cls, csv_path, path=DB_PATH):
+        if not cls.fresh(csv_path, path):
+            cls.build(csv_path, path)
+        return cls(path)
+
+    @staticmethod
+    def fresh(csv_path, path):
+        try:
+            with closing(sqlite3.connect('file:{}?mode=ro'.format(path), uri=True)) as con:
+                meta = json.loads(con.execute("SELECT value FROM meta WHERE key = 'meta'").fetchone()[0])
+        except (sqlite3.Error, TypeError, ValueError):
+            return False
+        if meta.get('format') != FORMAT or meta['schema'] != SCHEMA:
+            return False
+        return not os.path.exists(csv_path) or meta['source'] == source_stamp(csv_path)
+
+    # load the CSV into a new database file (in chunks, so memory stays bounded) and swap it in
+    @staticmethod
+    def build(csv_path, path=DB_PATH):
+        source = source_stamp(csv_path) # taken before reading, so a change mid-read is picked up next time
+        columns = list(SCHEMA)
+        types = {'category': 'TEXT', 'float64': 'REAL'}
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        os.close(fd)
+        try:
+            con = sqlite3.connect(tmp)
+            con.execute('CREATE TABLE placements ({})'.format(
+                ', '.join('{} {}'.format(name, types.get(dtype, 'INTEGER')) for name, dtype in SCHEMA.items())))
+            insert = 'INSERT INTO placements VALUES ({})'.format(', '.join('?' * len(columns)))
+            for chunk in pd.read_csv(csv_path, chunksize=CHUNKSIZE, low_memory=False):
+                chunk = chunk[columns]
+                chunk = chunk.astype(object).where(chunk.notna(), None) # NaN -> NULL
+                con.executemany(insert, chunk.itertuples(index=False, name=None))
+            for index in [['startYear', 'Media', 'Device'], ['Title'], ['imgCount'], ['averageRating']]:
+                con.execute('CREATE INDEX placements_{} ON placements ({})'.format('_'.join(index), ', '.join(index)))
+            con.execute('ANALYZE')
+            meta = {
+                'source': source,
+                'format': FORMAT,
+                'schema': SCHEMA,
+                'rows': con.execute('SELECT COUNT(*) FROM placements').fetchone()[0],
+                'layout': layout(
+                    column(con, 'SELECT Title FROM placements GROUP BY Title ORDER BY MIN(rowid)'),
+                    column(con, 'SELECT Media FROM placements GROUP BY Media ORDER BY MIN(rowid)'),
+                    column(con, 'SELECT Device FROM placements GROUP BY Device ORDER BY MIN(rowid)'),
+                    column(con, 'SELECT DISTINCT startYear FROM placements ORDER BY startYear'),
+                    column(con, 'SELECT DISTINCT imgCount FROM placements ORDER BY imgCount')
+                )
+            }
+            con.execute('CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)')
+            con.execute("INSERT INTO meta VALUES ('meta', ?)", (json.dumps(meta),))
+            con.commit()
+            con.close()
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def connection(self):
+        # a connection opened before a fork (gunicorn's preload) mustn't be used by the workers
+        if getattr(self._local, 'pid', None) != os.getpid():
+            self._local.con = sqlite3.connect('file:{}?mode=ro'.format(self.path), uri=True)
+            self._local.pid = os.getpid()
+        return self._local.con
+
+    def query(self, sql, params=()):
+        return pd.read_sql_query(sql, self.connection(), params=params)
+
+    def query_value(self, sql, params=()):
+        return self.connection().execute(sql, params).fetchone()[0]
+
+    def device_counts(self, *filters):
+        clause, params = where(filters, not_null=['Device'])
+        return self.query('SELECT Device, COUNT(Device) AS count FROM placements{} '
+                          'GROUP BY Device ORDER BY Device'.format(clause), params)
+
+    def title_points(self, *filters):
+        keys = ', '.join(TITLE_KEYS)
+        clause, params = where(filters, not_null=TITLE_KEYS)
+        out = self.query(
+            'SELECT {0}, COUNT(averageRating) AS rated, MIN(averageRating) AS low, MAX(averageRating) AS high, '
+            'COUNT(Episode) AS Episode, SUM(imgCount) AS imgCount FROM placements{1} '
+            'GROUP BY {0} ORDER BY {0}'.format(keys, clause), params)
+        # the mean rating has to come out exactly as pandas' (compensated) mean would. a title's rows
+        # nearly always share one rating, and then the sum is that of `rated` copies of it; the
+        # titles whose rows differ are summed row by row, in row order
+        rated = out['rated'].to_numpy()
+        low = out['low'].to_numpy(dtype=np.float64)
+        sums = repeated_sums(np.nan_to_num(low), rated)
+        mixed = np.flatnonzero(out['low'].to_numpy() != out['high'].to_numpy())
+        if len(mixed):
+            groups = out.loc[mixed, TITLE_KEYS].assign(group=np.arange(len(mixed)))
+            tconsts = groups['tconst'].unique().tolist()
+            rows = self.query(
+                'SELECT {0}, averageRating FROM placements{1} AND averageRating IS NOT NULL AND tconst IN ({2}) '
+                'ORDER BY rowid'.format(keys, clause, ', '.join('?' * len(tconsts))), params + tconsts)
+            rows = rows.merge(groups, on=TITLE_KEYS) # inner merge keeps the row order
+            sums[mixed] = compensated_sums(rows['group'].to_numpy(), rows['averageRating'].to_numpy(), len(mixed))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            out['averageRating'] = sums / rated
+        return out[TITLE_KEYS + ['averageRating', 'Episode', 'imgCount']]
+
+    def device_years(self, *filters, how='mean'):
+        clause, params = where(filters, not_null=['startYear', 'Device'])
+        out = self.query(
+            'SELECT startYear, Device, COUNT(imgCount) AS rows, SUM(imgCount) AS total, '
+            'SUM(averageRating) AS rating_sum, COUNT(averageRating) AS rating_count FROM placements{} '
+            'GROUP BY startYear, Device ORDER BY startYear, Device'.format(clause), params)
+        if how == 'count':
+            out['imgCount'] = out['rows']
+        elif how == 'sum':
+            out['imgCount'] = out['total']
+        else:
+            out['imgCount'] = out['total'] / out['rows']
+        out['averageRating'] = out['rating_sum'] / out['rating_count']
+        return out[['startYear', 'Device', 'imgCount', 'averageRating']]
+
+    def title_rows(self):
+        return self.query('SELECT Title, Media, startYear FROM placements WHERE Title IS NOT NULL '
+                          'GROUP BY Title, Media, startYear ORDER BY MIN(rowid)')
+
+    def frame(self, columns):
+        return self.query('SELECT {} FROM placements ORDER BY rowid'.format(', '.join(columns)))
+
+    # paged through one cursor, in the CSV's row order
+    def export(self, *filters, chunksize=CHUNKSIZE):
+        clause, params = where(filters)
+        cursor = self.connection().execute(
+            'SELECT {} FROM placements{} ORDER BY rowid'.format(', '.join(SCHEMA), clause), params)
+        while True:
+            rows = cursor.fetchmany(chunksize)
+            if not rows:
+                return
+            yield pd.DataFrame.from_records(rows, columns=list(SCHEMA))
+
+    def episode_totals(self):
+        keys = ', '.join(LEVELS + ['Device'])
+        return self.query(
+            "SELECT {0}, COUNT(*) AS rows, SUM(imgCount) AS imgCount FROM placements WHERE Media = 'Show' "
+            "AND {1} GROUP BY {0} ORDER BY {0}".format(keys, ' AND '.join(name + ' IS NOT NULL' for name in LEVELS + ['Device'])))
+
+    def clear(self):
+        pass
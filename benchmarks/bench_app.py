@@ -0,0 +1,205 @@
+# benchmark suite for the dashboard: startup plus every callback, at several data scales
+#
+# each scale runs in a fresh subprocess (so startup and memory are measured from a cold import)
+# which imports app.py against a synthetic copy of the data, then replays a representative set
+# of filter states through title, pie_devices, scatter_ratings and line_device_time.
+# reported per callback: p50/p95 latency, mean peak allocation (tracemalloc) and process RSS;
+# plus "page": the three charts for a selection requested one after another, as a
+# single-threaded worker answers them (this is where FIGURE_WORKERS shows up).
+# FIGURE_BUILDER/FIGURE_WORKERS etc. are passed through to the app, e.g.
+#   FIGURE_BUILDER=fast FIGURE_WORKERS=2 python benchmarks/bench_app.py --compare px.json
+#
+# usage: python benchmarks/bench_app.py [--scales 1 10 100] [--repeat 5] [--warm]
+#                                       [--save results.json] [--compare results.json]
+# (run from the repo root; scaled data is generated into benchmarks/data on first use)
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+CALLBACKS = ['title', 'pie_devices', 'scatter_ratings', 'line_device_time']
+
+
+# the selections replayed through the callbacks, built from whatever data was loaded
+def filter_states(meta):
+    import snapshot
+    years = snapshot.default_years(meta)
+    img_counts = [meta['imgCount']['min'], meta['imgCount']['max']]
+    mid_year = (years[0] + years[1]) // 2
+    titles = meta['titles']
+    devices = meta['devices']
+    return [
+        (None, years, ['Movie', 'Show'], devices, img_counts, [0, 10]), # the default page
+        (None, years, ['Movie', 'Show'], None, img_counts, [0, 10]),
+        (None, [mid_year, years[1]], ['Show'], devices, img_counts, [0, 10]),
+        (None, years, ['Movie'], devices[:2], img_counts, [0, 10]),
+        (None, years, ['Movie', 'Show'], devices, [img_counts[0] + 2, img_counts[1]], [0, 10]),
+        (None, years, ['Movie', 'Show'], devices, img_counts, [6, 8.5]),
+        (titles[:5], years, ['Movie', 'Show'], devices, img_counts, [0, 10]),
+        (titles[::max(len(titles) // 50, 1)], [mid_year, mid_year], None, None, img_counts, [2, 9]),
+        (None, [meta['year']['min'], meta['year']['max']], ['Movie', 'Show'], devices, img_counts, [0, 10]), # every year
+    ]
+
+
+def calls(app, states):
+    for state in states:
+        title, year, type, device, imgCount, rating = state
+        yield 'title', state, lambda: app.title(type, year, None, None)
+        yield 'pie_devices', state, lambda: app.pie_devices(*state)
+        yield 'scatter_ratings', state, lambda: app.scatter_ratings(*state)
+        for how in ['mean', 'count', 'sum']:
+            yield 'line_device_time', state, lambda how=how: app.line_device_time(*state, how)
+
+
+def rss_mb():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 # peak, not current
+
+
+# runs inside the subprocess: import the app, replay the states, print the results as JSON
+def measure(repeat, warm):
+    started = time.perf_counter()
+    import snapshot
+    snapshot.load_data()
+    loaded = time.perf_counter()
+    import app # CSV/snapshot load, indexes + layout
+    imported = time.perf_counter()
+    result = {
+        'rows': app.backend.size,
+        'startup': {
+            'load_data_s': loaded - started,
+            'import_app_s': imported - loaded, # loads the data again, now from the OS cache
+            'rss_mb': rss_mb()
+        },
+        'callbacks': {}
+    }
+    states = filter_states(app.meta)
+
+    def reset():
+        while app.render_pool.pending: # let background renders finish before timing the next call
+            time.sleep(0.001)
+        if not warm:
+            app.backend.clear()
+            app.figure_cache.clear()
+
+    # the callbacks on their own first, without rendering their sibling charts in the background
+    workers = app.render_pool.workers
+    app.render_pool.workers = 0
+    latencies = {name: [] for name in CALLBACKS}
+    for _ in range(repeat):
+        for name, state, call in calls(app, states):
+            reset()
+            start = time.perf_counter()
+            call()
+            latencies[name].append(time.perf_counter() - start)
+    app.render_pool.workers = workers
+    page = []
+    for _ in range(repeat):
+        for state in states:
+            reset()
+            start = time.perf_counter()
+            app.pie_devices(*state)
+            app.scatter_ratings(*state)
+            app.line_device_time(*state, 'mean')
+            page.append(time.perf_counter() - start)
+    app.render_pool.workers = 0
+    allocations = {name: [] for name in CALLBACKS}
+    tracemalloc.start()
+    for name, state, call in calls(app, states):
+        reset()
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        call()
+        allocations[name].append(tracemalloc.get_traced_memory()[1] - before)
+    tracemalloc.stop()
+    for name in CALLBACKS:
+        result['callbacks'][name] = {
+            'p50_ms': float(np.percentile(latencies[name], 50)) * 1000,
+            'p95_ms': float(np.percentile(latencies[name], 95)) * 1000,
+            'alloc_kb': float(np.mean(allocations[name])) / 1024
+        }
+    result['page'] = {
+        'p50_ms': float(np.percentile(page, 50)) * 1000,
+        'p95_ms': float(np.percentile(page, 95)) * 1000
+    }
+    result['peak_rss_mb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return result
+
+
+def run_scale(factor, repeat, warm):
+    import synthetic
+    path = synthetic.generate(factor)
+    env = dict(os.environ, DATA_CSV=os.path.abspath(path),
+               DATA_SNAPSHOT_DIR=os.path.join(os.path.abspath(synthetic.OUT_DIR), f'snapshot-{factor}x'))
+    command = [sys.executable, os.path.abspath(__file__), '--worker', '--repeat', str(repeat)]
+    if warm:
+        command.append('--warm')
+    out = subprocess.run(command, env=env, cwd=ROOT, capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def report(results, baseline=None, threshold=0.2):
+    regressions = []
+    for factor, result in results.items():
+        startup = result['startup']
+        print(f"\n{factor}x ({result['rows']} rows): load_data {startup['load_data_s']*1000:.1f} ms, "
+              f"import app {startup['import_app_s']*1000:.1f} ms, RSS {startup['rss_mb']:.1f} MB "
+              f"(peak {result['peak_rss_mb']:.1f} MB)")
+        print(f'  {"callback":<20}{"p50 (ms)":>10}{"p95 (ms)":>10}{"alloc (KB)":>12}')
+        for name, stats in result['callbacks'].items():
+            line = f"  {name:<20}{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}{stats['alloc_kb']:>12.1f}"
+            before = (baseline or {}).get(factor, {}).get('callbacks', {}).get(name)
+            if before:
+                change = stats['p50_ms'] / before['p50_ms'] - 1
+                line += f'  {change:+.0%} vs baseline'
+                if change > threshold:
+                    regressions.append(f'{name} at {factor}x: p50 {change:+.0%}')
+            print(line)
+        if 'page' in result:
+            stats = result['page']
+            line = f"  {'page (3 charts)':<20}{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}"
+            before = (baseline or {}).get(factor, {}).get('page')
+            if before:
+                line += f"{'':>12}  {stats['p50_ms'] / before['p50_ms'] - 1:+.0%} vs baseline"
+            print(line)
+    if regressions:
+        print('\nregressions:\n  ' + '\n  '.join(regressions))
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark startup and the dashboard callbacks.')
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 10, 100], help='data sizes, as multiples of data/data.csv')
+    parser.add_argument('--repeat', type=int, default=5, help='passes over the filter states per callback')
+    parser.add_argument('--warm', action='store_true', help="keep the filter/figure caches between calls (default: cold)")
+    parser.add_argument('--save', metavar='JSON', help='write the results here')
+    parser.add_argument('--compare', metavar='JSON', help='earlier results to flag regressions against')
+    parser.add_argument('--threshold', type=float, default=0.2, help='p50 slowdown that counts as a regression')
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        print(json.dumps(measure(args.repeat, args.warm)))
+        sys.exit()
+    results = {str(factor): run_scale(factor, args.repeat, args.warm) for factor in args.scales}
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    regressions = report(results, baseline, args.threshold)
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+    sys.exit(1 if regressions else 0)
@@ -0,0 +1,133 @@
+# the season/episode drill-down: opening a node from the tree index (drilldown.py) vs a groupby
+# over the rows
+#
+# for each scale, builds the tree from the data plus one made-up long-running show
+# (--seasons x --episodes episodes, a few placements each), then times opening the shows (their
+# seasons) and their seasons (the episodes), and reports p50/p95 for the index and for the
+# groupby it replaces, plus the time to build the index and the memory it holds. every node's
+# children are checked against the groupby
+#
+# usage: python benchmarks/bench_drilldown.py [--scales 1 10 100] [--seasons 40] [--episodes 25]
+# (run from the repo root; scaled data is generated into benchmarks/data on first use)
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+LONG_SHOW = 'The Long-Running Show'
+NODES = 200 # nodes opened per level
+
+
+# rows for a show with seasons x episodes episodes, 1-4 placements each
+def long_show(df, seasons, episodes, seed=0):
+    rng = np.random.default_rng(seed)
+    season, episode = np.divmod(np.arange(seasons * episodes), episodes)
+    repeats = rng.integers(1, 5, len(season))
+    devices = df['Device'].cat.categories
+    count = int(repeats.sum())
+    rows = pd.DataFrame({
+        'tconst': 'tt0000000',
+        'Title': LONG_SHOW,
+        'Season': np.repeat(season + 1, repeats),
+        'Episode': np.repeat(episode + 1, repeats),
+        'imgCount': rng.integers(1, 10, count),
+        'averageRating': 7.5,
+        'numVotes': 1000,
+        'startYear': df['startYear'].max(),
+        'Media': 'Show',
+        'Device': devices[rng.integers(0, len(devices), count)]
+    })
+    return pd.concat([df, rows.astype({name: df[name].dtype for name in ['Season', 'Episode']})], ignore_index=True)
+
+
+def groupby(shows, title, season):
+    rows = shows[shows['Title'] == title]
+    level = 'Season'
+    if season is not None:
+        rows, level = rows[rows['Season'] == season], 'Episode'
+    return rows.groupby([level, 'Device'], observed=True).agg(rows=('imgCount', 'size'), imgCount=('imgCount', 'sum')).reset_index()
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    out = function(*args)
+    return out, time.perf_counter() - start
+
+
+# runs inside the subprocess (DATA_CSV points at the scaled data)
+def measure(seasons, episodes):
+    import snapshot
+    from drilldown import DrillIndex, leaf_totals
+    df = long_show(snapshot.read_csv(), seasons, episodes)
+    devices = snapshot.describe(df)['devices']
+    start = time.perf_counter()
+    index = DrillIndex(leaf_totals(df), devices)
+    result = {
+        'rows': len(df),
+        'build_s': time.perf_counter() - start,
+        'index_mb': sum(array.nbytes for array in index.rows + index.img_counts + index.offsets) / 2**20
+    }
+    shows = df[df['Media'] == 'Show']
+    rng = random.Random(0)
+    titles = [LONG_SHOW] + rng.sample(index.titles(), min(NODES, len(index.titles())))
+    nodes = {'show': [(title, None) for title in titles],
+             'season': [(title, rng.choice(index.seasons(title))) for title in titles]}
+    nodes['long show season'] = [(LONG_SHOW, season) for season in index.seasons(LONG_SHOW)]
+    for level, pairs in nodes.items():
+        index_s, groupby_s = [], []
+        for title, season in pairs:
+            got, seconds = timed(index.children, title, season)
+            index_s.append(seconds)
+            expected, seconds = timed(groupby, shows, title, season)
+            groupby_s.append(seconds)
+            key = 'Season' if season is None else 'Episode'
+            assert sorted(zip(got['key'], got['Device'], got['rows'], got['imgCount'])) == sorted(
+                zip(expected[key].astype(int), expected['Device'].astype(str), expected['rows'], expected['imgCount'])), (title, season)
+        result[level] = {'index_p50': float(np.percentile(index_s, 50)), 'index_p95': float(np.percentile(index_s, 95)),
+                         'groupby_p50': float(np.percentile(groupby_s, 50)), 'groupby_p95': float(np.percentile(groupby_s, 95))}
+    _, result['long_show_s'] = timed(index.children, LONG_SHOW, None)
+    return result
+
+
+def run_scale(factor, seasons, episodes):
+    import synthetic
+    path = synthetic.generate(factor)
+    env = dict(os.environ, DATA_CSV=os.path.abspath(path))
+    out = subprocess.run([sys.executable, os.path.abspath(__file__), '--worker', '--seasons', str(seasons),
+                          '--episodes', str(episodes)], env=env, cwd=ROOT, capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def report(factor, result, seasons, episodes):
+    print(f"\n{factor}x ({result['rows']} rows): index built in {result['build_s'] * 1000:.0f} ms, "
+          f"{result['index_mb']:.1f} MB; opening the {seasons * episodes}-episode show "
+          f"{result['long_show_s'] * 1000:.2f} ms")
+    print(f'  {"opening":<20}{"index p50 (ms)":>16}{"p95":>8}{"groupby p50 (ms)":>18}{"p95":>8}')
+    for level in ['show', 'season', 'long show season']:
+        row = result[level]
+        print(f'  {level:<20}{row["index_p50"] * 1000:>16.2f}{row["index_p95"] * 1000:>8.2f}'
+              f'{row["groupby_p50"] * 1000:>18.2f}{row["groupby_p95"] * 1000:>8.2f}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Time opening drill-down nodes.')
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 10, 100], help='data sizes, as multiples of data/data.csv')
+    parser.add_argument('--seasons', type=int, default=40, help='seasons of the made-up long-running show')
+    parser.add_argument('--episodes', type=int, default=25, help='episodes per season of the made-up show')
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        print(json.dumps(measure(args.seasons, args.episodes)))
+        sys.exit()
+    for factor in args.scales:
+        report(factor, run_scale(factor, args.seasons, args.episodes), args.seasons, args.episodes)
@@ -0,0 +1,128 @@
+# the IMDb enrichment (enrich in pipeline.py): time and memory of refreshing the data from the
+# bulk files, and of re-running it
+#
+# for each scale, writes made-up title.ratings.tsv.gz/title.basics.tsv.gz (--dump-rows titles,
+# which include every title in the data, a tenth of them with new ratings) and runs the
+# enrichment on a copy of the data, each run in a fresh process:
+#   - first:      nothing looked up yet, so both files are read through
+#   - again:      nothing changed, nothing read or rewritten
+#   - re-cleaned: the data back to its old values (as after re-running the pipeline), the files
+#                 unchanged: the values found last time are written back without reading them
+#   - new files:  the files replaced, another tenth of the ratings changed: read through again
+# and reports the time, the titles whose values changed and the peak RSS of the process, which
+# should depend on the chunk size and the number of titles in the data, not on the files' size
+#
+# usage: python benchmarks/bench_enrich.py [--scales 1 10 100] [--dump-rows 2000000]
+# (run from the repo root; scaled data is generated into benchmarks/data on first use)
+import argparse
+import csv
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+PHASES = ['first', 'again', 're-cleaned', 'new files']
+
+
+# the bulk files: the data's titles (a tenth with a new rating and more votes) among made-up ones
+def write_dumps(data, imdb_dir, rows, seed):
+    rng = np.random.default_rng(seed)
+    ours = pd.read_csv(data, usecols=['tconst', 'averageRating', 'numVotes', 'startYear'], low_memory=False).drop_duplicates('tconst')
+    filler = max(rows - len(ours), 0)
+    changed = rng.random(len(ours)) < 0.1
+    ratings = pd.DataFrame({
+        'tconst': np.concatenate([ours['tconst'].to_numpy(dtype=object), [f'tt{90000000 + i}' for i in range(filler)]]),
+        'averageRating': np.concatenate([np.where(changed, np.clip(ours['averageRating'] + 0.1, 1, 10).round(1), ours['averageRating']),
+                                         rng.integers(10, 100, filler) / 10]),
+        'numVotes': np.concatenate([ours['numVotes'] + changed * rng.integers(1, 100, len(ours)), rng.integers(5, 10**6, filler)])
+    }).sample(frac=1, random_state=seed)
+    years = np.concatenate([ours['startYear'].to_numpy(), rng.integers(1900, 2024, filler)])
+    basics = pd.DataFrame({
+        'tconst': ratings['tconst'],
+        'titleType': 'movie',
+        'primaryTitle': 'Some title',
+        'originalTitle': 'Some title',
+        'isAdult': 0,
+        'startYear': years[ratings.index],
+        'endYear': None,
+        'runtimeMinutes': 90,
+        'genres': 'Drama'
+    })
+    os.makedirs(imdb_dir, exist_ok=True)
+    for name, frame in [('title.ratings.tsv.gz', ratings), ('title.basics.tsv.gz', basics)]:
+        frame.to_csv(os.path.join(imdb_dir, name), sep='\t', index=False, na_rep='\\N', quoting=csv.QUOTE_NONE)
+
+
+# the process's peak RSS (ru_maxrss would carry over the parent's from before the exec)
+def peak_rss():
+    try:
+        with open('/proc/self/status') as f:
+            return next(int(line.split()[1]) * 1024 for line in f if line.startswith('VmHWM:'))
+    except OSError: # not Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+# runs inside the subprocess: one enrichment run
+def measure(out, imdb_dir):
+    import pipeline
+    start = time.perf_counter()
+    changed = pipeline.enrich(out, imdb_dir, build_snapshot=False)
+    return {'seconds': time.perf_counter() - start, 'changed': changed, 'rss': peak_rss()}
+
+
+def run_phase(out, imdb_dir):
+    result = subprocess.run([sys.executable, os.path.abspath(__file__), '--worker', out, imdb_dir], cwd=ROOT,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(result.strip().splitlines()[-1])
+
+
+def run_scale(factor, dump_rows):
+    import synthetic
+    path = synthetic.generate(factor)
+    work = os.path.join(os.path.abspath(synthetic.OUT_DIR), f'enrich-{factor}x')
+    shutil.rmtree(work, ignore_errors=True)
+    out, imdb_dir = os.path.join(work, 'data.csv'), os.path.join(work, 'imdb')
+    os.makedirs(work)
+    shutil.copyfile(path, out)
+    write_dumps(out, imdb_dir, dump_rows, seed=0)
+    result = {'rows': sum(1 for _ in open(out)) - 1, 'dump_mb': sum(
+        os.path.getsize(os.path.join(imdb_dir, name)) for name in os.listdir(imdb_dir)) / 2**20}
+    result['first'] = run_phase(out, imdb_dir)
+    result['again'] = run_phase(out, imdb_dir)
+    shutil.copyfile(path, out)
+    result['re-cleaned'] = run_phase(out, imdb_dir)
+    write_dumps(path, imdb_dir, dump_rows, seed=1)
+    result['new files'] = run_phase(out, imdb_dir)
+    shutil.rmtree(work)
+    return result
+
+
+def report(factor, result, dump_rows):
+    print(f"\n{factor}x ({result['rows']} rows), files of {dump_rows:,} titles ({result['dump_mb']:.0f} MB gzipped)")
+    print(f'  {"run":<14}{"seconds":>10}{"titles changed":>16}{"peak RSS (MB)":>16}')
+    for phase in PHASES:
+        row = result[phase]
+        print(f'  {phase:<14}{row["seconds"]:>10.2f}{row["changed"]:>16}{row["rss"] / 2**20:>16.0f}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measure refreshing the data from the IMDb bulk files.')
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 10, 100], help='data sizes, as multiples of data/data.csv')
+    parser.add_argument('--dump-rows', type=int, default=2_000_000, help='titles in the made-up IMDb files')
+    parser.add_argument('--worker', nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        print(json.dumps(measure(*args.worker)))
+        sys.exit()
+    for factor in args.scales:
+        report(factor, run_scale(factor, args.dump_rows), args.dump_rows)
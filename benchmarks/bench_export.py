@@ -0,0 +1,84 @@
+# the /export route: throughput and memory while streaming the rows behind a selection
+#
+# for each scale, downloads every row (the widest selection) in each format through the app's
+# test client, reading the body a piece at a time as a browser would, and reports the rows/s, the
+# size of the download and the peak memory allocated while it streamed (tracemalloc, in a second
+# download, since tracing slows it down several times). the peak should stay at about a chunk's
+# worth (EXPORT_CHUNK_ROWS) however many rows are exported. every year is kept loaded
+# (PARTITION_CACHE_SIZE), so that it is the export's own memory and not years being reloaded
+#
+# usage: python benchmarks/bench_export.py [--scales 1 10 100]
+# (run from the repo root; scaled data is generated into benchmarks/data on first use)
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+# runs inside the subprocess (DATA_CSV points at the scaled data)
+def measure():
+    import app
+    import export
+    client = app.server.test_client()
+    meta = app.meta
+    selection = (None, [meta['year']['min'], meta['year']['max']], None, None, None, None)
+    url = '/export?' + export.query('csv', *selection)
+    client.get(url).get_data() # loads every year's partition first
+    result = {'rows': app.backend.size, 'formats': {}}
+    for format in export.formats():
+        url = '/export?' + export.query(format, *selection)
+        start = time.perf_counter()
+        size = download(client, url)
+        elapsed = time.perf_counter() - start
+        tracemalloc.start()
+        download(client, url)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        result['formats'][format] = {'seconds': elapsed, 'bytes': size, 'peak': peak}
+    return result
+
+
+# bytes downloaded, without keeping them
+def download(client, url):
+    response = client.get(url, buffered=False)
+    size = sum(len(piece) for piece in response.response)
+    response.close()
+    return size
+
+
+def run_scale(factor):
+    import synthetic
+    path = synthetic.generate(factor)
+    env = dict(os.environ, DATA_CSV=os.path.abspath(path),
+               DATA_SNAPSHOT_DIR=os.path.join(os.path.abspath(synthetic.OUT_DIR), f'snapshot-{factor}x'))
+    env.setdefault('PARTITION_CACHE_SIZE', '1000')
+    out = subprocess.run([sys.executable, os.path.abspath(__file__), '--worker'], env=env, cwd=ROOT,
+                         capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def report(factor, result):
+    print(f"\n{factor}x ({result['rows']} rows)")
+    print(f'  {"format":<10}{"rows/s":>12}{"size (MB)":>12}{"peak alloc (MB)":>18}')
+    for format, row in result['formats'].items():
+        print(f'  {format:<10}{result["rows"] / row["seconds"]:>12,.0f}{row["bytes"] / 2**20:>12.1f}'
+              f'{row["peak"] / 2**20:>18.1f}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measure streaming the selected rows from /export.')
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 10, 100], help='data sizes, as multiples of data/data.csv')
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        print(json.dumps(measure()))
+        sys.exit()
+    for factor in args.scales:
+        report(factor, run_scale(factor))
@@ -0,0 +1,45 @@
+# microbenchmark: the index-backed FilterEngine.mask vs the pandas mask app.py used to build
+# run from the repo root with `python benchmarks/bench_filters.py`
+import os
+import sys
+import timeit
+import pandas as pd
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from filters import FilterEngine, normalize
+
+
+# the original mask from the chart callbacks, kept here as the reference implementation
+def pandas_mask(df, title, year, type, device, imgCount, rating):
+    if title == None or title == []:
+        title = df['Title'].unique()
+    if type == None or type == []:
+        type = df['Media'].unique()
+    if device == None or device == []:
+        device = df['Device'].unique()
+    return (df['Title'].isin(title) & (df['startYear'] >= year[0]) & (df['startYear'] <= year[1])
+            & df['Media'].isin(type) & df['Device'].isin(device) & (df['imgCount'] >= imgCount[0])
+            & (df['imgCount'] <= imgCount[1]) & (df['averageRating'] >= rating[0])
+            & (df['averageRating'] <= rating[1]))
+
+
+selections = {
+    'default': (None, [2020, 2023], ['Movie', 'Show'], None, [0, 143], [0, 10]),
+    'one media, two devices': (None, [2021, 2022], ['Show'], ['iPhone', 'MacBook'], [3, 50], [5, 8.5]),
+    'three titles': (['Found', 'Loki', 'Beef'], [2020, 2023], None, None, [0, 143], [0, 10]),
+}
+
+if __name__ == '__main__':
+    df = pd.read_csv('data/data.csv', low_memory=False)
+    df = df[df['startYear'] > 2019]
+    engine = FilterEngine(df)
+    number = 200
+    print(f'{len(df)} rows, {number} runs per selection\n')
+    print(f'{"selection":<26}{"pandas (ms)":>14}{"indexed (ms)":>14}{"speedup":>10}')
+    for name, selection in selections.items():
+        key = normalize(*selection)
+        assert np.array_equal(pandas_mask(df, *selection).to_numpy(), engine.mask(key)), name
+        before = timeit.timeit(lambda: pandas_mask(df, *selection), number=number) / number * 1000
+        after = timeit.timeit(lambda: engine.mask(key), number=number) / number * 1000
+        print(f'{name:<26}{before:>14.3f}{after:>14.3f}{before / after:>9.1f}x')
@@ -0,0 +1,135 @@
+# filtering while a user explores: one widget changed at a time, with and without the
+# per-session masks (SessionMasks in filters.py)
+#
+# for each scale, replays the same random walk through the widgets -- every step nudges one of
+# the six (a slider moved, a device toggled, a title picked, ...) -- for a few interleaved
+# sessions, through the pandas backend's three chart queries, and reports per step (p50/p95):
+#   - the time to evaluate the filters (FilterEngine.mask), which is what the session masks save
+#   - the time for the three chart queries together (filtering, grouping and aggregating)
+# plus the bytes the masks take per session. every step's rows are checked against the plain
+# evaluation
+#
+# usage: python benchmarks/bench_interaction.py [--scales 1 10 100] [--steps 300]
+# (run from the repo root; scaled data is generated into benchmarks/data on first use)
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+SESSIONS = 4
+
+
+# the next selection of a session: the last one with one widget changed
+def nudge(meta, state, rng):
+    state = list(state)
+    widget = rng.randrange(6)
+    if widget == 0:
+        state[0] = rng.choice([None, rng.sample(meta['titles'], 3)])
+    elif widget == 1:
+        low = rng.randint(meta['year']['min'], meta['year']['max'])
+        state[1] = [low, rng.randint(low, meta['year']['max'])]
+    elif widget == 2:
+        state[2] = rng.choice([['Movie'], ['Show'], ['Movie', 'Show']])
+    elif widget == 3:
+        state[3] = rng.sample(meta['devices'], rng.randint(1, len(meta['devices'])))
+    elif widget == 4:
+        low = rng.randint(meta['imgCount']['min'], meta['imgCount']['max'] // 4)
+        state[4] = [low, rng.randint(low, meta['imgCount']['max'])]
+    else:
+        low = round(rng.uniform(0, 9), 1)
+        state[5] = [low, round(rng.uniform(low, 10), 1)]
+    return tuple(state)
+
+
+def walk(meta, steps, seed=0):
+    import snapshot
+    rng = random.Random(seed)
+    start = (None, snapshot.default_years(meta), ['Movie', 'Show'], meta['devices'],
+             [meta['imgCount']['min'], meta['imgCount']['max']], [0, 10])
+    states = {session: start for session in range(SESSIONS)}
+    for _ in range(steps):
+        session = rng.randrange(SESSIONS)
+        states[session] = nudge(meta, states[session], rng)
+        yield session, states[session]
+
+
+# runs inside the subprocess (DATA_CSV points at the scaled data)
+def measure(steps):
+    import snapshot
+    from backends import PandasBackend
+    from filters import SessionMasks, normalize
+    df = snapshot.read_csv()
+    meta = snapshot.describe(df)
+    result = {'rows': len(df)}
+    masks = {}
+    for name, sessions in [('plain', None), ('session', SessionMasks())]:
+        backend = PandasBackend(df, meta, sessions=sessions)
+        mask_s, query_s = [], []
+        for session, state in walk(meta, steps):
+            if sessions is not None:
+                sessions.use(session)
+            key = normalize(*state)
+            start = time.perf_counter()
+            mask = backend.engine.mask(key)
+            mask_s.append(time.perf_counter() - start)
+            if name == 'plain':
+                masks[len(mask_s)] = np.flatnonzero(mask)
+            else:
+                assert np.array_equal(np.flatnonzero(mask), masks[len(mask_s)]), state
+            backend.clear()
+            start = time.perf_counter()
+            backend.device_counts(*state)
+            backend.title_points(*state)
+            backend.device_years(*state, how='mean')
+            query_s.append(time.perf_counter() - start)
+        result[name] = {
+            'mask_p50': float(np.percentile(mask_s, 50)), 'mask_p95': float(np.percentile(mask_s, 95)),
+            'query_p50': float(np.percentile(query_s, 50)), 'query_p95': float(np.percentile(query_s, 95))
+        }
+        if sessions is not None:
+            stats = sessions.stats()
+            result[name]['bytes_per_session'] = stats['bytes'] / max(stats['sessions'], 1)
+            result[name]['reused'] = stats['reused'] / max(stats['reused'] + stats['computed'], 1)
+    return result
+
+
+def run_scale(factor, steps):
+    import synthetic
+    path = synthetic.generate(factor)
+    env = dict(os.environ, DATA_CSV=os.path.abspath(path))
+    out = subprocess.run([sys.executable, os.path.abspath(__file__), '--worker', '--steps', str(steps)],
+                         env=env, cwd=ROOT, capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def report(factor, result):
+    session = result['session']
+    print(f"\n{factor}x ({result['rows']} rows): {session['reused']:.0%} of the filters reused, "
+          f"{session['bytes_per_session'] / 1024:.0f} KB per session")
+    print(f'  {"":<10}{"filters p50 (ms)":>18}{"p95":>9}{"3 queries p50 (ms)":>20}{"p95":>9}')
+    for name in ['plain', 'session']:
+        row = result[name]
+        print(f'  {name:<10}{row["mask_p50"] * 1000:>18.3f}{row["mask_p95"] * 1000:>9.3f}'
+              f'{row["query_p50"] * 1000:>20.1f}{row["query_p95"] * 1000:>9.1f}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measure filtering for one-widget-at-a-time changes.')
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 10, 100], help='data sizes, as multiples of data/data.csv')
+    parser.add_argument('--steps', type=int, default=300, help='widget changes replayed (over all sessions)')
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        print(json.dumps(measure(args.steps)))
+        sys.exit()
+    for factor in args.scales:
+        report(factor, run_scale(factor, args.steps))
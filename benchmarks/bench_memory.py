@@ -0,0 +1,100 @@
+# memory footprint of the loaded frame: the raw CSV dtypes vs the compact schema (snapshot.SCHEMA)
+#
+# for each scale, prints every column's deep memory usage as pandas reads it from the CSV and
+# as the app holds it, and checks the charts come out the same either way: the filter states
+# from bench_app.py go through pie_devices/scatter_ratings/line_device_time once on each frame,
+# and the figure JSON has to match exactly.
+#
+# usage: python benchmarks/bench_memory.py [--scales 1 10 100] [--no-check]
+# (run from the repo root; scaled data is generated into benchmarks/data on first use)
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+def raw_frame(csv_path):
+    import pandas as pd
+    return pd.read_csv(csv_path, low_memory=False)
+
+
+def column_memory(df):
+    usage = df.memory_usage(deep=True, index=False)
+    return {name: int(usage[name]) for name in df.columns}
+
+
+# swap the frame the app's callbacks work from (as a data reload does) and render every chart
+def figures(app, df, states):
+    from backends import PandasBackend
+    app.backend = PandasBackend(df, app.meta)
+    app.figure_cache.clear()
+    out = []
+    for state in states:
+        out.append(app.pie_devices(*state))
+        out.append(app.scatter_ratings(*state))
+        for how in ['mean', 'count', 'sum']:
+            out.append(app.line_device_time(*state, how))
+    return json.dumps(out)
+
+
+# runs inside the subprocess (DATA_CSV points at the scaled data)
+def measure(check):
+    import snapshot
+    raw = raw_frame(snapshot.CSV_PATH)
+    compact = snapshot.compact(raw)
+    result = {
+        'rows': len(raw),
+        'dtypes': {name: [str(raw[name].dtype), str(compact[name].dtype)] for name in raw.columns},
+        'before': column_memory(raw),
+        'after': column_memory(compact)
+    }
+    if check:
+        import app
+        from bench_app import filter_states
+        states = filter_states(app.meta)
+        result['identical'] = figures(app, raw, states) == figures(app, compact, states)
+    return result
+
+
+def run_scale(factor, check):
+    import synthetic
+    path = synthetic.generate(factor)
+    env = dict(os.environ, DATA_CSV=os.path.abspath(path),
+               DATA_SNAPSHOT_DIR=os.path.join(os.path.abspath(synthetic.OUT_DIR), f'snapshot-{factor}x'))
+    command = [sys.executable, os.path.abspath(__file__), '--worker'] + ([] if check else ['--no-check'])
+    out = subprocess.run(command, env=env, cwd=ROOT, capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def report(factor, result):
+    before, after = sum(result['before'].values()), sum(result['after'].values())
+    print(f"\n{factor}x ({result['rows']} rows): {before / 2**20:.2f} MB -> {after / 2**20:.2f} MB "
+          f"({after / before - 1:+.0%})")
+    print(f'  {"column":<15}{"dtype":>28}{"before (KB)":>14}{"after (KB)":>13}')
+    for name, (old, new) in result['dtypes'].items():
+        print(f"  {name:<15}{old + ' -> ' + new:>28}{result['before'][name] / 1024:>14.1f}"
+              f"{result['after'][name] / 1024:>13.1f}")
+    if 'identical' in result:
+        print('  figures identical' if result['identical'] else '  FIGURES DIFFER')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare the memory of the raw and compact frames.')
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 10, 100], help='data sizes, as multiples of data/data.csv')
+    parser.add_argument('--no-check', action='store_true', help="skip rendering the charts on both frames")
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        print(json.dumps(measure(not args.no_check)))
+        sys.exit()
+    differ = False
+    for factor in args.scales:
+        result = run_scale(factor, not args.no_check)
+        report(factor, result)
+        differ |= result.get('identical') is False
+    sys.exit(1 if differ else 0)
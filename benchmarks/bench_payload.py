@@ -0,0 +1,126 @@
+# bytes over the wire for the chart callbacks: plain JSON vs gzip/brotli, plus serialization and
+# the response cache
+#
+# for each scale, posts the filter states from bench_app.py to each chart callback through the
+# app's test client, the way the browser does, and reports per chart (medians over the states):
+#   - the response size as before (no compression) and gzipped/brotli'd (compression.py)
+#   - the time to serialize the response with plotly's json engine, and with orjson if installed
+#   - the request latency the first time (figure and response caches empty) and when the same
+#     request is repeated (answered from the kept response)
+#
+# usage: python benchmarks/bench_payload.py [--scales 1 10 100]
+# (run from the repo root; scaled data is generated into benchmarks/data on first use)
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+FILTERS = ['title', 'year', 'type', 'device', 'imgCount', 'rating']
+CHARTS = [('pie-devices', None), ('scatter-ratings', None), ('line-device-time', 'mean')]
+ENCODINGS = [None, 'gzip', 'br']
+
+
+def body(output, state, radio):
+    inputs = [{'id': name, 'property': 'value', 'value': value} for name, value in zip(FILTERS, state)]
+    if radio:
+        inputs.append({'id': 'line_device_radio', 'property': 'value', 'value': radio})
+    return {'output': output + '.figure', 'outputs': {'id': output, 'property': 'figure'},
+            'inputs': inputs, 'changedPropIds': [], 'state': []}
+
+
+def post(client, request, encoding):
+    headers = {'Accept-Encoding': encoding} if encoding else {}
+    start = time.perf_counter()
+    response = client.post('/_dash-update-component', json=request, headers=headers)
+    elapsed = time.perf_counter() - start
+    assert response.status_code == 200, response.status_code
+    return response, elapsed
+
+
+# time to serialize a callback response the way dash does, with each of plotly's json engines
+def serialize_times(pio, response_json):
+    value = json.loads(response_json)
+    engines = ['json']
+    try:
+        import orjson
+        engines.append('orjson')
+    except ImportError:
+        pass
+    times = {}
+    for engine in engines:
+        start = time.perf_counter()
+        for _ in range(5):
+            pio.json.to_json_plotly(value, engine=engine)
+        times[engine] = (time.perf_counter() - start) / 5
+    return times
+
+
+# runs inside the subprocess (DATA_CSV points at the scaled data)
+def measure():
+    import app
+    from bench_app import filter_states
+    client = app.server.test_client()
+    result = {}
+    for output, radio in CHARTS:
+        rows = []
+        for state in filter_states(app.meta):
+            request = body(output, state, radio)
+            app.backend.clear()
+            app.figure_cache.clear()
+            app.compressor.set_version(app.loaded_version) # empties the kept responses
+            row = {}
+            first, row['first_s'] = post(client, request, 'gzip')
+            _, row['repeat_s'] = post(client, request, 'gzip')
+            for encoding in ENCODINGS:
+                response, _ = post(client, request, encoding)
+                if response.headers.get('Content-Encoding', None) == encoding:
+                    row[encoding or 'plain'] = len(response.get_data())
+            plain, _ = post(client, request, None)
+            row.update(serialize_times(app.pio, plain.get_data()))
+            rows.append(row)
+        result[output] = {key: float(np.median([row[key] for row in rows])) for key in rows[0]}
+    return result
+
+
+def run_scale(factor):
+    import synthetic
+    path = synthetic.generate(factor)
+    env = dict(os.environ, DATA_CSV=os.path.abspath(path),
+               DATA_SNAPSHOT_DIR=os.path.join(os.path.abspath(synthetic.OUT_DIR), f'snapshot-{factor}x'))
+    out = subprocess.run([sys.executable, os.path.abspath(__file__), '--worker'], env=env, cwd=ROOT,
+                         capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def report(factor, result):
+    print(f'\n{factor}x')
+    print(f'  {"chart":<18}{"plain (KB)":>11}{"gzip (KB)":>11}{"br (KB)":>9}{"json (ms)":>11}{"orjson (ms)":>13}'
+          f'{"first (ms)":>12}{"repeat (ms)":>13}')
+    for output, row in result.items():
+        cells = [f"{row['plain'] / 1024:>11.1f}", f"{row['gzip'] / 1024:>11.1f}",
+                 f"{row['br'] / 1024:>9.1f}" if 'br' in row else f'{"-":>9}',
+                 f"{row['json'] * 1000:>11.2f}",
+                 f"{row['orjson'] * 1000:>13.2f}" if 'orjson' in row else f'{"-":>13}',
+                 f"{row['first_s'] * 1000:>12.1f}", f"{row['repeat_s'] * 1000:>13.2f}"]
+        print(f'  {output:<18}' + ''.join(cells))
+    print('  (medians over the filter states; "-": the package is not installed)')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measure the chart callback payloads.')
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 10, 100], help='data sizes, as multiples of data/data.csv')
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        print(json.dumps(measure()))
+        sys.exit()
+    for factor in args.scales:
+        report(factor, run_scale(factor))
@@ -0,0 +1,123 @@
+# cold start: how long a fresh process takes to import the app and then serve the first page
+#
+# this is what a visitor waits for after the host has spun the app down. each run is a fresh
+# subprocess which times
+#   - import: `import app` from nothing (dash, pandas, the data, the indexes and the layout)
+#   - first page: the index page, layout and dependencies requests, then the three chart
+#     requests the page sends for its default selection. the first request starts loading
+#     plotly express and the figure template in the background; a browser is still fetching
+#     the page's scripts meanwhile, but here the charts come straight after and wait for it
+# and the slowest top-level imports are listed from `python -X importtime`.
+# exits with 1 when the median import time is over --budget seconds
+#
+# usage: python benchmarks/bench_startup.py [--scales 1 10 100] [--repeat 5] [--budget 1.0]
+# (run from the repo root; scaled data is generated into benchmarks/data on first use)
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_BUDGET_S = 1.0 # on a laptop-class CPU, at 1x
+CHARTS = [('pie-devices', None), ('scatter-ratings', None), ('line-device-time', 'mean')]
+
+
+# the chart requests the page sends on load, for the widgets' default values
+def chart_bodies(meta):
+    import snapshot
+    defaults = [
+        ('title', None),
+        ('year', snapshot.default_years(meta)),
+        ('type', ['Movie', 'Show']),
+        ('device', meta['devices']),
+        ('imgCount', [meta['imgCount']['min'], meta['imgCount']['max']]),
+        ('rating', [0, 10])
+    ]
+    for output, radio in CHARTS:
+        inputs = [{'id': name, 'property': 'value', 'value': value} for name, value in defaults]
+        if radio:
+            inputs.append({'id': 'line_device_radio', 'property': 'value', 'value': radio})
+        yield {'output': output + '.figure', 'outputs': {'id': output, 'property': 'figure'},
+               'inputs': inputs, 'changedPropIds': [], 'state': []}
+
+
+# runs inside the subprocess
+def measure():
+    start = time.perf_counter()
+    import app
+    imported = time.perf_counter()
+    client = app.server.test_client()
+    for path in ['/', '/_dash-layout', '/_dash-dependencies']:
+        assert client.get(path).status_code == 200, path
+    shell = time.perf_counter()
+    for body in chart_bodies(app.meta):
+        assert client.post('/_dash-update-component', json=body).status_code == 200, body['output']
+    charts = time.perf_counter()
+    return {'import_s': imported - start, 'shell_s': shell - imported, 'charts_s': charts - shell}
+
+
+# the top-level imports of `import app` which take longest (cumulative), in seconds
+def slowest_imports(env, count=8):
+    err = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'], env=env, cwd=ROOT,
+                         capture_output=True, text=True, check=True).stderr
+    imports = []
+    for line in err.splitlines():
+        if line.startswith('import time:') and '|' in line:
+            _, cumulative, name = line[len('import time:'):].split('|')
+            depth = (len(name) - len(name.lstrip()) - 1) // 2 # indented two spaces per level
+            if depth == 1: # imported by app.py itself
+                imports.append((int(cumulative) / 1e6, name.strip()))
+            elif depth == 0 and name.strip() == 'app':
+                imports.append((int(cumulative) / 1e6, 'app (total)'))
+    return sorted(imports, reverse=True)[:count]
+
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+
+def run_scale(factor, repeat):
+    import synthetic
+    path = synthetic.generate(factor)
+    env = dict(os.environ, DATA_CSV=os.path.abspath(path),
+               DATA_SNAPSHOT_DIR=os.path.join(os.path.abspath(synthetic.OUT_DIR), f'snapshot-{factor}x'))
+    runs = []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, os.path.abspath(__file__), '--worker'], env=env, cwd=ROOT,
+                             capture_output=True, text=True, check=True).stdout
+        runs.append(json.loads(out.strip().splitlines()[-1]))
+    result = {key: median([run[key] for run in runs]) for key in runs[0]}
+    result['imports'] = slowest_imports(env)
+    return result
+
+
+def report(factor, result, budget):
+    total = result['import_s'] + result['shell_s'] + result['charts_s']
+    print(f"\n{factor}x: import {result['import_s']*1000:.0f} ms (budget {budget*1000:.0f} ms), "
+          f"page shell {result['shell_s']*1000:.0f} ms, first charts {result['charts_s']*1000:.0f} ms, "
+          f"total {total*1000:.0f} ms")
+    for seconds, name in result['imports']:
+        print(f'  {name:<40}{seconds*1000:>8.0f} ms')
+    return result['import_s'] <= budget
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Time a cold start of the app.')
+    parser.add_argument('--scales', type=int, nargs='+', default=[1], help='data sizes, as multiples of data/data.csv')
+    parser.add_argument('--repeat', type=int, default=5, help='fresh processes per scale (the median is reported)')
+    parser.add_argument('--budget', type=float, default=IMPORT_BUDGET_S, help='most seconds `import app` may take')
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        print(json.dumps(measure()))
+        sys.exit()
+    within = [report(factor, run_scale(factor, args.repeat), args.budget) for factor in args.scales]
+    if not all(within):
+        print('\nimport time over budget')
+    sys.exit(0 if all(within) else 1)
@@ -0,0 +1,132 @@
+# memory of a gunicorn deployment, with and without preloading the app (gunicorn.conf.py)
+#
+# for each scale, starts `gunicorn app:server` with --workers n, once with GUNICORN_PRELOAD=0 and
+# once with GUNICORN_PRELOAD=1, sends every worker a few page loads and chart requests, then reads
+# /proc/<pid>/smaps_rollup for the master and each worker:
+#   - rss: what `ps`/`top` show, counting shared pages in every process which maps them
+#   - pss: shared pages split between the processes sharing them (sums to the real total)
+#   - uss: pages only that process has (what killing the worker would free)
+#
+# usage: python benchmarks/bench_workers.py [--scales 1 10 100] [--workers 4]
+# (run from the repo root, on Linux; scaled data is generated into benchmarks/data on first use)
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+FILTERS = ['title', 'year', 'type', 'device', 'imgCount', 'rating']
+CHARTS = [('pie-devices', None), ('scatter-ratings', None), ('line-device-time', 'mean')]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def request(url, body=None):
+    data = json.dumps(body).encode() if body is not None else None
+    headers = {'Content-Type': 'application/json'} if body is not None else {}
+    with urllib.request.urlopen(urllib.request.Request(url, data=data, headers=headers), timeout=600) as response:
+        return response.read()
+
+
+# the chart requests the page sends for the unfiltered selection
+def chart_bodies():
+    for output, radio in CHARTS:
+        inputs = [{'id': name, 'property': 'value', 'value': None} for name in FILTERS]
+        if radio:
+            inputs.append({'id': 'line_device_radio', 'property': 'value', 'value': radio})
+        yield {'output': output + '.figure', 'outputs': {'id': output, 'property': 'figure'},
+               'inputs': inputs, 'changedPropIds': [], 'state': []}
+
+
+def children(pid):
+    out = []
+    for entry in os.listdir('/proc'):
+        if entry.isdigit():
+            try:
+                with open(f'/proc/{entry}/stat') as f:
+                    if int(f.read().rsplit(')', 1)[1].split()[1]) == pid:
+                        out.append(int(entry))
+            except (OSError, IndexError, ValueError):
+                pass
+    return sorted(out)
+
+
+# rss/pss/uss of a process, in MB
+def memory(pid):
+    fields = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                fields[parts[0].rstrip(':')] = int(parts[1]) / 1024
+    return {'rss': fields['Rss'], 'pss': fields['Pss'],
+            'uss': fields['Private_Clean'] + fields['Private_Dirty']}
+
+
+def run(csv_path, snapshot_dir, workers, preload, requests_per_worker=3):
+    port = free_port()
+    env = dict(os.environ, DATA_CSV=csv_path, DATA_SNAPSHOT_DIR=snapshot_dir,
+               GUNICORN_PRELOAD='1' if preload else '0')
+    command = [sys.executable, '-m', 'gunicorn', 'app:server', '--workers', str(workers),
+               '--bind', f'127.0.0.1:{port}', '--timeout', '600', '--log-level', 'warning']
+    server = subprocess.Popen(command, env=env, cwd=ROOT)
+    url = f'http://127.0.0.1:{port}'
+    try:
+        start = time.perf_counter()
+        while True:
+            try:
+                request(url + '/')
+                break
+            except OSError:
+                if server.poll() is not None:
+                    raise RuntimeError('gunicorn exited')
+                time.sleep(0.2)
+        ready = time.perf_counter() - start
+        # enough traffic that every worker has loaded the page and drawn the charts
+        for _ in range(workers * requests_per_worker):
+            request(url + '/')
+            request(url + '/_dash-layout')
+            for body in chart_bodies():
+                request(url + '/_dash-update-component', body)
+        master = memory(server.pid)
+        per_worker = [memory(pid) for pid in children(server.pid)]
+    finally:
+        server.terminate()
+        server.wait()
+    return {'ready': ready, 'master': master, 'workers': per_worker}
+
+
+def report(factor, workers, results):
+    print(f'\n{factor}x, {workers} workers')
+    print(f'  {"preload":<10}{"ready (s)":>10}{"worker rss":>12}{"worker pss":>12}{"worker uss":>12}{"total pss":>12}')
+    for preload, result in results.items():
+        count = len(result['workers']) or 1
+        mean = {key: sum(w[key] for w in result['workers']) / count for key in ['rss', 'pss', 'uss']}
+        total = result['master']['pss'] + sum(w['pss'] for w in result['workers'])
+        print(f'  {preload:<10}{result["ready"]:>10.1f}{mean["rss"]:>12.1f}{mean["pss"]:>12.1f}'
+              f'{mean["uss"]:>12.1f}{total:>12.1f}')
+    print('  (MB; per-worker numbers are the mean over the workers)')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare worker memory with and without preloading.')
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 10, 100], help='data sizes, as multiples of data/data.csv')
+    parser.add_argument('--workers', type=int, default=4, help='gunicorn workers')
+    args = parser.parse_args()
+    os.chdir(ROOT)
+    import synthetic
+    for factor in args.scales:
+        csv_path = os.path.abspath(synthetic.generate(factor))
+        snapshot_dir = os.path.join(os.path.abspath(synthetic.OUT_DIR), f'snapshot-{factor}x')
+        results = {name: run(csv_path, snapshot_dir, args.workers, preload) for name, preload in [('off', False), ('on', True)]}
+        report(factor, args.workers, results)
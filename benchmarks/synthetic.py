@@ -0,0 +1,57 @@
+# synthetic data for benchmarking: data/data.csv scaled up 10x/100x/1000x
+#
+# each copy of the data gets its own tconst/Title (so the catalog grows, not just the row count),
+# with imgCount and averageRating jittered per copy to keep the distributions realistic.
+# usage: python benchmarks/synthetic.py 10 100 [--out benchmarks/data]
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+
+SRC_PATH = 'data/data.csv'
+OUT_DIR = 'benchmarks/data'
+
+
+def scale(df, factor, seed=0):
+    rng = np.random.default_rng(seed)
+    copies = np.repeat(np.arange(factor), len(df))
+    out = pd.concat([df] * factor, ignore_index=True)
+    suffix = pd.Series(copies).astype(str)
+    later = copies > 0 # copy 0 is the original data, unchanged
+    out.loc[later, 'tconst'] = out.loc[later, 'tconst'] + '-' + suffix[later]
+    out.loc[later, 'Title'] = out.loc[later, 'Title'] + ' #' + suffix[later]
+    # one rating shift per synthetic title, so ratings stay constant within a title
+    codes = pd.factorize(out['tconst'])[0]
+    shift = np.round(rng.normal(0, 0.5, codes.max() + 1), 1)
+    shift[codes[~later]] = 0
+    out['averageRating'] = np.clip(out['averageRating'] + shift[codes], 1, 10).round(1)
+    noise = rng.integers(-2, 3, len(out))
+    out['imgCount'] = np.where(later, np.maximum(out['imgCount'] + noise, 1), out['imgCount'])
+    return out
+
+
+def path_for(factor, out_dir=OUT_DIR):
+    return os.path.join(out_dir, f'data-{factor}x.csv')
+
+
+# write the scaled CSV (unless it's already there) and return its path
+def generate(factor, src=SRC_PATH, out_dir=OUT_DIR):
+    path = path_for(factor, out_dir)
+    if factor == 1:
+        return src
+    if not os.path.exists(path):
+        os.makedirs(out_dir, exist_ok=True)
+        scale(pd.read_csv(src, low_memory=False), factor).to_csv(path, index=False)
+    return path
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Scale data/data.csv up for benchmarking.')
+    parser.add_argument('factors', type=int, nargs='+', help='how many copies of the data, e.g. 10 100 1000')
+    parser.add_argument('--src', default=SRC_PATH)
+    parser.add_argument('--out', default=OUT_DIR)
+    args = parser.parse_args()
+    for factor in args.factors:
+        print(generate(factor, args.src, args.out))
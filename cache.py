@@ -0,0 +1,159 @@
+# figure cache for the chart callbacks
+#
+# most visitors sit on the default selections (or one of a few common ones), so rather than
+# rebuilding and re-serializing the same plotly figure on every request, the finished figure
+# JSON is kept in a bounded, thread-safe LRU keyed by the normalized widget values. an optional
+# directory backend lets several gunicorn workers on one machine share the results
+import functools
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from contextlib import nullcontext
+
+import plotly.io as pio
+
+from filters import normalize
+from coalesce import SingleFlight
+
+
+class FigureCache:
+    def __init__(self, maxsize=128, ttl=3600, directory=None, version=None, metrics=None):
+        self.maxsize = maxsize
+        self.ttl = ttl # seconds an entry stays valid (None keeps it until it is evicted)
+        self.directory = directory
+        self.version = version # identifies the data the figures were built from
+        self.metrics = metrics # optional, times the figure serialization
+        self._entries = OrderedDict() # key -> (expires, figure)
+        self._lock = threading.Lock()
+        self.flights = SingleFlight() # concurrent misses for the same key build the figure once
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0 # subset of hits which came from another worker via the directory
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    # canonical string for a figure name + its six filter inputs (+ any extra inputs, like the radio)
+    def make_key(self, name, filters, extra=()):
+        return json.dumps([self.version, name, normalize(*filters), list(extra)], default=str)
+
+    def _expires(self):
+        return None if self.ttl is None else time.time() + self.ttl
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode()).hexdigest() + '.json')
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, figure = entry
+                if expires is None or expires > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return figure
+                del self._entries[key]
+        figure = self._read(key, now)
+        with self._lock:
+            if figure is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.disk_hits += 1
+            self._store(key, figure)
+        return figure
+
+    def set(self, key, figure):
+        with self._lock:
+            self._store(key, figure)
+        self._write(key, figure)
+
+    # memory side of set(); expects self._lock to be held
+    def _store(self, key, figure):
+        self._entries[key] = (self._expires(), figure)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def _read(self, key, now):
+        if not self.directory:
+            return None
+        try:
+            with open(self._path(key)) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry['key'] != key or (entry['expires'] is not None and entry['expires'] <= now):
+            return None
+        return entry['figure']
+
+    def _write(self, key, figure):
+        if not self.directory:
+            return
+        # write to a temp file and rename it into place so other workers never read half a file
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'key': key, 'expires': self._expires(), 'figure': figure}, f)
+        os.replace(tmp, self._path(key))
+        self._prune()
+
+    # keep the directory to maxsize entries too, dropping the least recently written ones
+    def _prune(self):
+        try:
+            files = [os.path.join(self.directory, name) for name in os.listdir(self.directory)
+                     if name.endswith('.json')]
+            if len(files) <= self.maxsize:
+                return
+            files.sort(key=os.path.getmtime)
+            for path in files[:len(files) - self.maxsize]:
+                os.remove(path)
+        except OSError:
+            pass # another worker got there first
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    # the data changed: nothing cached so far (here or in the shared directory) applies anymore
+    def set_version(self, version):
+        with self._lock:
+            self.version = version
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'disk_hits': self.disk_hits,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
+
+    # decorator for a figure builder taking the six filter inputs (and optionally extra ones);
+    # the builder's figure is serialized once, and the JSON is what gets cached and returned
+    def memoize(self, name):
+        def decorator(build):
+            @functools.wraps(build)
+            def wrapper(title, year, type, device, imgCount, rating, *extra):
+                key = self.make_key(name, (title, year, type, device, imgCount, rating), extra)
+
+                def compute():
+                    fig = build(title, year, type, device, imgCount, rating, *extra)
+                    with self.metrics.phase('serialize') if self.metrics else nullcontext():
+                        figure = json.loads(pio.to_json(fig, validate=False)) # a Figure or a plain dict
+                    self.set(key, figure)
+                    return figure
+
+                figure = self.get(key)
+                if figure is None:
+                    figure = self.flights.run(key, compute)
+                return figure
+            return wrapper
+        return decorator
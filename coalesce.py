@@ -0,0 +1,102 @@
+# request coalescing for the chart callbacks
+#
+# dragging a slider fires a burst of callback requests, each of which would otherwise run the
+# full filter + figure build to completion even though only the last one matters. two things
+# cut that down (within a worker -- requests landing on other workers aren't visible here):
+#   - SingleFlight: identical requests in flight at the same time share one computation
+#   - Superseder: every callback request is numbered per (browser session, output) as it
+#     arrives; a request that has been overtaken by a newer one for the same output is dropped
+#     (PreventUpdate, so the browser keeps what it has) at the next check instead of finishing
+import functools
+import threading
+from collections import OrderedDict
+
+from dash.exceptions import PreventUpdate
+from flask import g, has_request_context
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self):
+        self._flights = {} # key -> _Flight currently computing it
+        self._lock = threading.Lock()
+        self.shared = 0 # calls answered by someone else's computation
+
+    def run(self, key, compute):
+        while True:
+            with self._lock:
+                flight = self._flights.get(key)
+                leader = flight is None
+                if leader:
+                    flight = self._flights[key] = _Flight()
+            if leader:
+                break
+            flight.done.wait()
+            if flight.error is None:
+                with self._lock:
+                    self.shared += 1
+                return flight.result
+            if not isinstance(flight.error, PreventUpdate):
+                raise flight.error
+            # the leader's own request was superseded, which says nothing about this one -- retry
+        try:
+            flight.result = compute()
+            return flight.result
+        except BaseException as error:
+            flight.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+
+class Superseder:
+    def __init__(self, enabled=True, max_sessions=10000):
+        self.enabled = enabled
+        self.max_sessions = max_sessions
+        self._latest = OrderedDict() # (session, output) -> number of the newest request seen
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    # number an incoming callback request (called from a before_request hook)
+    def register(self, session, output):
+        if not self.enabled:
+            return
+        key = (session, output)
+        with self._lock:
+            ticket = self._latest.get(key, 0) + 1
+            self._latest[key] = ticket
+            self._latest.move_to_end(key)
+            while len(self._latest) > self.max_sessions:
+                self._latest.popitem(last=False)
+        g.coalesce_ticket = (key, ticket)
+
+    # drop the current request if a newer one for the same output has arrived since
+    def check(self):
+        if not self.enabled or not has_request_context():
+            return
+        current = g.get('coalesce_ticket')
+        if current is None:
+            return
+        key, ticket = current
+        with self._lock:
+            stale = self._latest.get(key, ticket) != ticket
+            if stale:
+                self.dropped += 1
+        if stale:
+            raise PreventUpdate
+
+    # decorator: check before the callback does any work
+    def latest_only(self, function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            self.check()
+            return function(*args, **kwargs)
+        return wrapper
@@ -0,0 +1,144 @@
+# compression and ETags for the server's responses (COMPRESS_RESPONSES=1, the default)
+#
+# a chart callback answers with the whole plotly figure as JSON: tens to hundreds of KB, and very
+# repetitive (the same keys and styling on every trace), so it compresses several times over.
+# every JSON/HTML/JS/CSS response over min_size is compressed, with brotli when the browser
+# accepts it and the `brotli` package is installed, gzip otherwise.
+# a callback always gives the same answer to the same request for the same data, so its
+# response also gets an ETag made from the request (the output, the inputs and state) and the
+# data version, and the compressed bodies are kept by ETag: a repeated interaction is answered
+# straight from there without running the callback or serializing/compressing anything, and a
+# client which revalidates with If-None-Match gets a 304. the component bundles dash serves
+# (plotly.js etc., under fingerprinted URLs) are only compressed once per worker and kept too
+import gzip
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+from flask import Response, g
+
+try:
+    import brotli
+except ImportError: # gzip only
+    brotli = None
+
+
+COMPRESSIBLE = ['application/json', 'text/html', 'application/javascript', 'text/javascript', 'text/css']
+CALLBACK_PATH = '/_dash-update-component'
+BUNDLE_PATH = '/_dash-component-suites/'
+
+
+class Compressor:
+    def __init__(self, enabled=True, min_size=1024, level=6, maxsize=256, version=None):
+        self.enabled = enabled
+        self.min_size = min_size
+        self.level = level
+        self.maxsize = maxsize
+        self.version = version
+        self.cache = OrderedDict() # (key, accepted encoding) -> (body, its encoding), LRU
+        self.hits = 0
+        self.not_modified = 0
+        self.bytes_in = 0 # before compression
+        self.bytes_out = 0
+        self._lock = threading.Lock()
+
+    # new data: the old responses no longer apply
+    def set_version(self, version):
+        with self._lock:
+            self.version = version
+            self.cache.clear()
+
+    def encoding(self, request):
+        if brotli is not None and 'br' in request.accept_encodings:
+            return 'br'
+        if 'gzip' in request.accept_encodings:
+            return 'gzip'
+        return None
+
+    def compress(self, body, encoding):
+        if encoding == 'br':
+            return brotli.compress(body, quality=min(self.level, 11))
+        if encoding == 'gzip':
+            return gzip.compress(body, compresslevel=self.level)
+        return body
+
+    # the same for the same callback request for the same data
+    def etag(self, request):
+        body = request.get_json(silent=True)
+        key = json.dumps([self.version, body], sort_keys=True, separators=(',', ':'))
+        return hashlib.sha1(key.encode()).hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                return self.cache[key]
+        return None
+
+    def put(self, key, entry):
+        with self._lock:
+            self.cache[key] = entry
+            while len(self.cache) > self.maxsize:
+                self.cache.popitem(last=False)
+
+    def respond(self, body, encoding, etag=None):
+        response = Response(body, mimetype='application/json')
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        if etag:
+            response.set_etag(etag)
+        response.vary.add('Accept-Encoding')
+        return response
+
+    # before_request: answer a callback request from the kept responses, if it can be
+    def cached(self, request):
+        if not self.enabled or request.method != 'POST' or not request.path.endswith(CALLBACK_PATH):
+            return None
+        etag = g.response_etag = self.etag(request)
+        if etag in request.if_none_match:
+            self.not_modified += 1
+            response = Response(status=304)
+            response.set_etag(etag)
+            return response
+        entry = self.get((etag, self.encoding(request)))
+        if entry is None:
+            return None
+        self.hits += 1
+        return self.respond(*entry, etag)
+
+    # after_request: compress the response (and keep it, for callbacks and bundles)
+    def finish(self, request, response):
+        if (not self.enabled or response.status_code != 200 or response.direct_passthrough
+                or 'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIBLE):
+            return response
+        etag = g.get('response_etag')
+        key = etag if etag else request.full_path if BUNDLE_PATH in request.path else None
+        accepted = self.encoding(request)
+        entry = self.get((key, accepted)) if key else None
+        if entry is None:
+            raw = response.get_data()
+            encoding = accepted if len(raw) >= self.min_size else None
+            entry = self.compress(raw, encoding), encoding
+            with self._lock:
+                self.bytes_in += len(raw)
+                self.bytes_out += len(entry[0])
+            if key:
+                self.put((key, accepted), entry)
+        body, encoding = entry
+        response.set_data(body)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        if etag:
+            response.set_etag(etag)
+        return response
+
+    def stats(self):
+        return {
+            'size': len(self.cache),
+            'hits': self.hits,
+            'not_modified': self.not_modified,
+            'bytes_in': self.bytes_in,
+            'bytes_out': self.bytes_out
+        }
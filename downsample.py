@@ -0,0 +1,77 @@
+# thins out the scatterplot's points when there are more than the browser can usefully draw
+# (SCATTER_MAX_POINTS)
+#
+# at 10-100x the catalog, tens of thousands of titles land on a few thousand distinct spots
+# (imgCount is an integer, ratings go in tenths), so most markers are drawn on top of each other.
+# the points are binned per color group (year) on a grid over the chart -- in log space along a
+# log axis -- and each occupied cell keeps one point: its best-known title (most votes), whose
+# hover text says how many others it stands for. the grid starts at about screen resolution and
+# gets coarser until few enough cells are left. points alone in their cell (the outliers) are
+# always kept, and so are each group's extremes on both axes, so the axis ranges don't move
+import numpy as np
+import pandas as pd
+
+
+# x/y: column names; log_x: bin x in log10 space; weight: picks each cell's point (highest wins)
+def thin(df, x, y, group, max_points, log_x=False, weight=None, label=None):
+    if not max_points or len(df) <= max_points:
+        return df
+    xs = df[x].to_numpy(dtype=np.float64)
+    if log_x:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            xs = np.log10(xs)
+    ys = df[y].to_numpy(dtype=np.float64)
+    groups = pd.factorize(df[group])[0].astype(np.int64)
+    # rank of each point within the whole frame by weight (ties: first row first)
+    priority = np.arange(len(df))
+    if weight is not None:
+        priority = np.lexsort((priority, -df[weight].to_numpy(dtype=np.float64)))
+        priority = np.argsort(priority, kind='stable')
+    scale = 1.0
+    while True:
+        x_bins, y_bins = max(int(512 * scale), 1), max(int(256 * scale), 1)
+        cells = (groups * (x_bins + 1) + bin_index(xs, x_bins)) * (y_bins + 1) + bin_index(ys, y_bins)
+        unique_cells, first, counts = cell_representatives(cells, priority)
+        if len(first) <= max_points or x_bins == 1:
+            break
+        scale /= 2 ** 0.5 # half the cells
+    keep = np.zeros(len(df), dtype=bool)
+    keep[first] = True
+    for ids in pd.Series(np.arange(len(df))).groupby(groups).indices.values():
+        for values in [xs[ids], ys[ids]]:
+            if not np.isnan(values).all():
+                keep[ids[[np.nanargmin(values), np.nanargmax(values)]]] = True
+    # an extreme which isn't its cell's point is shown as well, so that point stands for one fewer
+    extra = keep.copy()
+    extra[first] = False
+    np.subtract.at(counts, np.searchsorted(unique_cells, cells[extra]), 1)
+    stands_for = np.ones(len(df), dtype=np.int64)
+    stands_for[first] = counts
+    out = df[keep].copy()
+    if label is not None:
+        others = stands_for[keep] - 1
+        names = out[label].astype(str).to_numpy(dtype=object)
+        more = others > 0
+        names[more] = [name + ' (+{} more)'.format(n) for name, n in zip(names[more], others[more])]
+        out[label] = names
+    return out
+
+
+# which of `bins` equal bins over the finite values each value falls in (missing values: bins)
+def bin_index(values, bins):
+    finite = np.isfinite(values)
+    out = np.full(len(values), bins, dtype=np.int64)
+    if finite.any():
+        low, high = values[finite].min(), values[finite].max()
+        scale = bins / (high - low) if high > low else 0
+        out[finite] = np.minimum(((values[finite] - low) * scale).astype(np.int64), bins - 1)
+    return out
+
+
+# the distinct cells (sorted), and for each: the row with the lowest priority and how many rows it holds
+def cell_representatives(cells, priority):
+    order = np.lexsort((priority, cells))
+    sorted_cells = cells[order]
+    starts = np.flatnonzero(np.r_[True, sorted_cells[1:] != sorted_cells[:-1]])
+    counts = np.diff(np.r_[starts, len(cells)])
+    return sorted_cells[starts], order[starts], counts
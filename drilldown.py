@@ -0,0 +1,128 @@
+# season/episode drill-down for the shows: title -> season -> episode, with the placements
+# (rows) and summed imgCount per device at every level
+#
+# the tree is built once, at load, from the per-(title, season, episode, device) totals (which
+# every backend can produce: a groupby over the frame, or a GROUP BY in SQLite). each level is
+# kept as arrays in tree order -- sorted by parent, then by key -- with a (nodes x devices)
+# matrix of subtotals, and a node's children are the contiguous run of the next level between
+# two offsets. opening a node is then a slice of the next level (O(children)), whatever the
+# size of the show or of the data, instead of a groupby over the rows
+import numpy as np
+import pandas as pd
+
+
+LEVELS = ['Title', 'Season', 'Episode']
+
+
+# the per-(title, season, episode, device) totals of the shows' rows: LEVELS, Device, rows,
+# imgCount. movies (and rows missing a season or episode) have nothing to drill into
+def leaf_totals(df):
+    shows = df[(df['Media'] == 'Show').to_numpy()]
+    shows = shows[LEVELS + ['Device']].assign(imgCount=shows['imgCount'].astype(np.int64))
+    return shows.groupby(LEVELS + ['Device'], observed=True).agg(
+        rows=('imgCount', 'size'),
+        imgCount=('imgCount', 'sum')
+    ).reset_index()
+
+
+class DrillIndex:
+    def __init__(self, leaves, devices):
+        self.devices = list(devices)
+        leaves = leaves[leaves['Device'].isin(self.devices)].sort_values(LEVELS, kind='stable')
+        titles = leaves['Title'].astype(str).to_numpy(dtype=object)
+        keys = [titles] + [leaves[level].to_numpy(dtype=np.int64) for level in LEVELS[1:]]
+        device = pd.Categorical(leaves['Device'].astype(str), categories=self.devices).codes
+        # the leaves' episodes: a new node wherever any level's key changes
+        changed = np.zeros(len(leaves), dtype=bool)
+        changed[:1] = True
+        starts = []
+        for values in keys:
+            changed[1:] |= values[1:] != values[:-1]
+            starts.append(np.flatnonzero(changed))
+        episode = np.cumsum(changed) - 1
+        # int32 is plenty for a show's counts, and halves the matrices (a few per cent of the data)
+        rows = np.zeros((len(starts[-1]), len(self.devices)), dtype=np.int32)
+        img_counts = np.zeros_like(rows)
+        np.add.at(rows, (episode, device), leaves['rows'].to_numpy())
+        np.add.at(img_counts, (episode, device), leaves['imgCount'].to_numpy())
+        # each level: its keys, the per-device totals and where its children start in the next level
+        self.keys, self.rows, self.img_counts, self.offsets = [], [], [], []
+        for level in range(len(LEVELS)):
+            first = np.searchsorted(starts[-1], starts[level]) # its first episode
+            self.keys.append(keys[level][starts[level]].tolist())
+            if level == len(LEVELS) - 1:
+                self.rows.append(rows)
+                self.img_counts.append(img_counts)
+            else:
+                self.rows.append(np.add.reduceat(rows, first, axis=0) if len(first) else rows[:0])
+                self.img_counts.append(np.add.reduceat(img_counts, first, axis=0) if len(first) else img_counts[:0])
+                children = np.searchsorted(starts[level + 1], starts[level])
+                self.offsets.append(np.append(children, len(starts[level + 1])))
+        self.title_nodes = {title: i for i, title in enumerate(self.keys[0])}
+
+    # the shows, by name
+    def titles(self):
+        return sorted(self.keys[0])
+
+    # the show with the most placements (the view's starting point)
+    def busiest(self):
+        if not self.keys[0]:
+            return None
+        return self.keys[0][int(np.argmax(self.rows[0].sum(axis=1)))]
+
+    # (level, node) for a show, or one of its seasons; None if it isn't there
+    def node(self, title, season=None):
+        index = self.title_nodes.get(title)
+        if index is None or season is None:
+            return None if index is None else (0, index)
+        start, stop = self.offsets[0][index], self.offsets[0][index + 1]
+        seasons = self.keys[1][start:stop]
+        position = start + int(np.searchsorted(seasons, season))
+        if position == stop or self.keys[1][position] != season:
+            return None
+        return (1, position)
+
+    # the seasons of a show
+    def seasons(self, title):
+        node = self.node(title)
+        if node is None:
+            return []
+        return self.keys[1][self.offsets[0][node[1]]:self.offsets[0][node[1] + 1]]
+
+    def columns(self, devices):
+        if not devices: # an empty dropdown means every device, as for the other charts
+            return np.arange(len(self.devices))
+        selected = set(devices)
+        return np.array([i for i, device in enumerate(self.devices) if device in selected], dtype=np.int64)
+
+    # totals for a node, over the selected devices: rows, imgCount and how many children it has
+    def summary(self, title, season=None, devices=None):
+        node = self.node(title, season)
+        if node is None:
+            return None
+        level, index = node
+        columns = self.columns(devices)
+        return {
+            'rows': int(self.rows[level][index, columns].sum()),
+            'imgCount': int(self.img_counts[level][index, columns].sum()),
+            'children': int(self.offsets[level][index + 1] - self.offsets[level][index])
+        }
+
+    # a node's children (a show's seasons, or a season's episodes) with their per-device totals,
+    # in long form -- key, Device, rows, imgCount -- leaving out the devices they don't have
+    def children(self, title, season=None, devices=None):
+        node = self.node(title, season)
+        columns = self.columns(devices)
+        if node is None:
+            return pd.DataFrame({'key': [], 'Device': [], 'rows': [], 'imgCount': []})
+        level, index = node
+        start, stop = self.offsets[level][index], self.offsets[level][index + 1]
+        rows = self.rows[level + 1][start:stop][:, columns]
+        img_counts = self.img_counts[level + 1][start:stop][:, columns]
+        child, column = np.nonzero(rows)
+        return pd.DataFrame({
+            'key': np.asarray(self.keys[level + 1][start:stop])[child],
+            'Device': np.asarray(self.devices, dtype=object)[columns[column]],
+            'rows': rows[child, column],
+            'imgCount': img_counts[child, column]
+        })
@@ -0,0 +1,123 @@
+# streaming export of the rows behind a selection (/export in app.py): CSV, JSON Lines or Parquet
+#
+# the query string carries the same six filters the charts get from the widgets (repeated once
+# per value: ?year=2020&year=2023&device=iPhone&device=iPad&format=csv), and the rows come from
+# the backend's own filtering a chunk at a time (export in backends.py). each chunk is encoded
+# and sent before the next one is read, so memory stays the same however many rows match.
+# Parquet needs the `pyarrow` package; every chunk becomes one row group
+from urllib.parse import urlencode
+
+import pandas as pd
+
+from snapshot import SCHEMA
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError: # CSV and JSON Lines only
+    pyarrow = None
+
+
+COLUMNS = list(SCHEMA)
+FORMATS = {
+    'csv': ('CSV', 'text/csv'),
+    'jsonl': ('JSON Lines', 'application/x-ndjson'),
+    'parquet': ('Parquet', 'application/vnd.apache.parquet')
+}
+DROPDOWNS = ['title', 'type', 'device']
+SLIDERS = [('year', int), ('imgCount', int), ('rating', float)]
+
+
+# the formats this server can write
+def formats():
+    return [name for name in FORMATS if name != 'parquet' or pyarrow is not None]
+
+
+# the export URL for a selection, with the widget values as the chart callbacks get them
+def query(format, title, year, type, device, imgCount, rating):
+    selection = {'title': title, 'year': year, 'type': type, 'device': device, 'imgCount': imgCount, 'rating': rating}
+    params = [('format', format)]
+    for name, values in selection.items():
+        if isinstance(values, str):
+            values = [values]
+        params += [(name, value) for value in values or []] # nothing selected: no filter
+    return urlencode(params)
+
+
+# the six filters from the query string, in the order the backends take them (ValueError if malformed)
+def filters(args):
+    values = {name: args.getlist(name) or None for name in DROPDOWNS}
+    for name, cast in SLIDERS:
+        bounds = args.getlist(name)
+        if bounds and len(bounds) != 2:
+            raise ValueError('{} takes two values, low and high'.format(name))
+        values[name] = [cast(bound) for bound in bounds] or None
+    return tuple(values[name] for name in ['title', 'year', 'type', 'device', 'imgCount', 'rating'])
+
+
+def csv_chunks(chunks):
+    yield pd.DataFrame(columns=COLUMNS).to_csv(index=False) # the header, even when nothing matches
+    for chunk in chunks:
+        yield chunk.to_csv(index=False, header=False)
+
+
+def jsonl_chunks(chunks):
+    for chunk in chunks:
+        yield chunk.to_json(orient='records', lines=True)
+
+
+# file-like object pyarrow writes the Parquet file into, drained after every row group
+class Sink:
+    def __init__(self):
+        self.parts = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        out = b''.join(self.parts)
+        self.parts = []
+        return out
+
+
+# arrow types for the columns as SCHEMA holds them (categoricals are written as plain strings;
+# Parquet dictionary-encodes them itself)
+def arrow_schema():
+    types = {'category': pyarrow.string(), 'Int16': pyarrow.int16(), 'int16': pyarrow.int16(),
+             'int32': pyarrow.int32(), 'float64': pyarrow.float64()}
+    return pyarrow.schema([(name, types[dtype]) for name, dtype in SCHEMA.items()])
+
+
+def parquet_chunks(chunks):
+    schema = arrow_schema()
+    sink = Sink()
+    writer = pyarrow.parquet.ParquetWriter(sink, schema)
+    for chunk in chunks:
+        writer.write_table(pyarrow.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+# the response body for the backend's chunks, as a generator of str/bytes
+def encode(chunks, format):
+    if format not in formats():
+        raise ValueError('format must be one of: {}'.format(', '.join(formats())))
+    if format == 'csv':
+        return csv_chunks(chunks)
+    if format == 'jsonl':
+        return jsonl_chunks(chunks)
+    return parquet_chunks(chunks)
@@ -0,0 +1,167 @@
+# the charts built as plain figure dicts (FIGURE_BUILDER=fast)
+#
+# plotly express runs every property of every trace through the graph_objects validators, and
+# that is most of what a chart callback costs once the filtering is fast. these builders write
+# out the same figure JSON px produces for these charts -- trace for trace, with the same
+# colors, hover templates and theme template -- so the browser can't tell the difference, they
+# just skip the validation
+import plotly.graph_objects as go
+
+try:
+    from _plotly_utils.utils import convert_to_base64 # numpy arrays -> plotly.js typed arrays
+except ImportError: # older plotly sends plain lists, as px does there too
+    def convert_to_base64(figure):
+        pass
+
+
+_template = None
+
+# the default (theme) template, as px embeds it in every figure
+def template():
+    global _template
+    if _template is None:
+        _template = go.Figure().to_dict()['layout']['template']
+    return _template
+
+
+def axis(anchor, title, **extra):
+    return {'anchor': anchor, 'domain': [0.0, 1.0], 'title': {'text': title}, **extra}
+
+
+def legend(title, traces):
+    if not traces:
+        return {'tracegroupgap': 0}
+    return {'title': {'text': title}, 'tracegroupgap': 0}
+
+
+def finish(data, layout):
+    figure = {'data': data, 'layout': {'template': template(), **layout}}
+    convert_to_base64(figure)
+    return figure
+
+
+# what a graph shows until its callback first returns: just the chart's title, no axes or theme
+# (so nothing has to be computed or loaded for it)
+def placeholder(title, height=None):
+    layout = {'title': {'text': title}, 'xaxis': {'visible': False}, 'yaxis': {'visible': False}}
+    if height is not None:
+        layout['height'] = height
+    return {'data': [], 'layout': layout}
+
+
+# device_counts: Device, count
+def pie(device_counts, title, height):
+    trace = {
+        'domain': {'x': [0.0, 1.0], 'y': [0.0, 1.0]},
+        'hovertemplate': 'Device=%{label}<br>count=%{value}<extra></extra>',
+        'labels': device_counts['Device'].to_numpy(),
+        'legendgroup': '',
+        'name': '',
+        'showlegend': True,
+        'values': device_counts['count'].to_numpy(),
+        'type': 'pie',
+        'direction': 'clockwise',
+        'sort': False
+    }
+    return finish([trace], {'legend': {'tracegroupgap': 0}, 'title': {'text': title}, 'height': height})
+
+
+# one trace of markers per year, colored from the template's colorway like px does. gl: WebGL
+# traces (scattergl), as px makes them with render_mode='webgl'
+def scatter(resolved_data, title, labels, gl=False):
+    colorway = template()['layout']['colorway']
+    years = resolved_data['year'].to_numpy()
+    traces = []
+    for i, year in enumerate(resolved_data['year'].sort_values().unique()):
+        group = resolved_data[years == year]
+        trace = {
+            'hovertemplate': '<b>%{hovertext}</b><br><br>' + labels['year'] + '=' + year + '<br>'
+                             + labels['imgCount'] + '=%{x}<br>' + labels['averageRating'] + '=%{y}<extra></extra>',
+            'hovertext': group['Title'].to_numpy(),
+            'legendgroup': year,
+            'marker': {'color': colorway[i % len(colorway)], 'symbol': 'circle',
+                       'line': {'color': 'DarkSlateGrey', 'width': 0.5}, 'size': 9},
+            'mode': 'markers',
+            'name': year,
+            'orientation': 'v',
+            'showlegend': True,
+            'x': group['imgCount'].to_numpy(),
+            'xaxis': 'x',
+            'y': group['averageRating'].to_numpy(),
+            'yaxis': 'y',
+            'type': 'scatter'
+        }
+        if gl:
+            del trace['orientation'] # not a scattergl attribute
+            trace['type'] = 'scattergl'
+        traces.append(trace)
+    return finish(traces, {
+        'xaxis': axis('y', labels['imgCount'], type='log'),
+        'yaxis': axis('x', labels['averageRating']),
+        'legend': legend(labels['year'], traces),
+        'title': {'text': title}
+    })
+
+
+# one line per device, in order of first appearance, colored from colors in that order
+def line(resolved_df, title, labels, colors, height):
+    devices = resolved_df['Device'].to_numpy()
+    traces = []
+    for i, device in enumerate(resolved_df['Device'].unique()):
+        group = resolved_df[devices == device]
+        traces.append({
+            'hovertemplate': 'Device=' + device + '<br>' + labels['startYear'] + '=%{x}<br>'
+                             + labels['imgCount'] + '=%{y}<extra></extra>',
+            'legendgroup': device,
+            'line': {'color': colors[i % len(colors)], 'dash': 'solid', 'width': 4},
+            'marker': {'symbol': 'circle', 'line': {'color': 'DarkSlateGrey', 'width': 0.5}, 'size': 9},
+            'mode': 'lines+markers',
+            'name': device,
+            'orientation': 'v',
+            'showlegend': True,
+            'x': group['startYear'].to_numpy(),
+            'xaxis': 'x',
+            'y': group['imgCount'].to_numpy(),
+            'yaxis': 'y',
+            'type': 'scatter'
+        })
+    return finish(traces, {
+        'xaxis': axis('y', labels['startYear'], type='category'),
+        'yaxis': axis('x', labels['imgCount']),
+        'legend': legend('Device', traces),
+        'title': {'text': title},
+        'height': height
+    })
+
+
+# stacked bars per device (drill-down): children is key, Device, rows, imgCount in long form;
+# one trace per device in the order of devices, colored from colors (device -> color)
+def bar(children, title, labels, devices, colors, height):
+    names = children['Device'].to_numpy()
+    traces = []
+    for device in [device for device in devices if device in set(names)]:
+        group = children[names == device]
+        traces.append({
+            'customdata': group[['rows']].to_numpy(),
+            'hovertemplate': 'Device=' + device + '<br>' + labels['key'] + '=%{x}<br>' + labels['imgCount']
+                             + '=%{y}<br>' + labels['rows'] + '=%{customdata[0]}<extra></extra>',
+            'legendgroup': device,
+            'marker': {'color': colors[device], 'pattern': {'shape': ''}},
+            'name': device,
+            'orientation': 'v',
+            'showlegend': True,
+            'textposition': 'auto',
+            'x': group['key'].to_numpy(),
+            'xaxis': 'x',
+            'y': group['imgCount'].to_numpy(),
+            'yaxis': 'y',
+            'type': 'bar'
+        })
+    return finish(traces, {
+        'xaxis': axis('y', labels['key'], type='category'),
+        'yaxis': axis('x', labels['imgCount']),
+        'legend': legend('Device', traces),
+        'title': {'text': title},
+        'barmode': 'relative',
+        'height': height
+    })
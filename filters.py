@@ -0,0 +1,247 @@
+# shared filter engine for the dashboard callbacks
+#
+# every chart callback in app.py filters the same frame by the same six selector widgets
+# (title, year, media type, device, imgCount, rating). instead of each callback rebuilding
+# that mask from scratch, they all call into the engine below, which evaluates the
+# predicate once per distinct selection and hands back the same resolved rows to everyone.
+# the predicate itself runs over indexes built at startup rather than scanning the columns.
+# a browser session exploring the data mostly nudges one widget at a time, so with SessionMasks
+# the engine also remembers each session's last selection and the rows passing each of its six
+# predicates, and only re-evaluates the predicates whose widget has changed since
+import itertools
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+
+
+# the column each of the six normalized filter values (see normalize) is evaluated against, and
+# whether it is a closed range rather than a set of values
+PREDICATES = [('Title', False), ('startYear', True), ('Media', False), ('Device', False),
+              ('imgCount', True), ('averageRating', True)]
+
+
+# turn the raw widget values into a hashable key, so equal selections share one result
+# (None or [] on a dropdown means "everything", which is the same as not filtering on it)
+def normalize(title=None, year=None, type=None, device=None, imgCount=None, rating=None):
+    def values(selected):
+        if selected is None or len(selected) == 0:
+            return None
+        if isinstance(selected, str):
+            selected = [selected]
+        return tuple(sorted(set(selected)))
+
+    def bounds(selected):
+        if selected is None or len(selected) == 0:
+            return None
+        return (selected[0], selected[1])
+
+    return (values(title), bounds(year), values(type), values(device), bounds(imgCount), bounds(rating))
+
+
+# inverted index for a categorical column: every value maps to a packed bitset of the rows
+# holding it, so "column is one of these values" is a handful of bitwise ORs. a bitset per value
+# costs rows/8 bytes each, which is too much for high-cardinality columns like Title -- those
+# keep each value's (sorted) row positions instead
+class BitmapIndex:
+    def __init__(self, column, max_bitmaps=256):
+        values = np.asarray(column)
+        self.size = len(values)
+        uniques, codes = np.unique(values, return_inverse=True)
+        self.values = uniques.tolist()
+        self.bitmaps = {}
+        self.postings = {}
+        if len(uniques) <= max_bitmaps:
+            for code, value in enumerate(self.values):
+                self.bitmaps[value] = np.packbits(codes == code)
+        else:
+            order = np.argsort(codes, kind='stable')
+            bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+            for code, value in enumerate(self.values):
+                self.postings[value] = order[bounds[code]:bounds[code+1]]
+
+    # packed bitset of the rows whose value is in selected (values we've never seen match nothing)
+    def any_of(self, selected):
+        if self.postings:
+            rows = np.zeros(self.size, dtype=bool)
+            for value in selected:
+                positions = self.postings.get(value)
+                if positions is not None:
+                    rows[positions] = True
+            return np.packbits(rows)
+        out = np.zeros((self.size + 7) // 8, dtype=np.uint8)
+        for value in selected:
+            bitmap = self.bitmaps.get(value)
+            if bitmap is not None:
+                out |= bitmap
+        return out
+
+    # same thing for a closed [low, high] range of values (used for the year slider)
+    def between(self, low, high):
+        return self.any_of([value for value in self.values if low <= value <= high])
+
+
+# sorted copy of a numeric column, so a closed range resolves with two searchsorted calls
+class SortedIndex:
+    def __init__(self, column):
+        values = np.asarray(column)
+        self.size = len(values)
+        self.order = np.argsort(values, kind='stable') # NaNs sort to the end and never match
+        self.sorted = values[self.order]
+
+    def between(self, low, high):
+        start = np.searchsorted(self.sorted, low, side='left')
+        stop = np.searchsorted(self.sorted, high, side='right')
+        rows = np.zeros(self.size, dtype=bool)
+        rows[self.order[start:stop]] = True
+        return np.packbits(rows)
+
+
+# per browser session (and engine): the last selection's key and a packed bitset per predicate,
+# so the next selection only re-evaluates the predicates that differ from it. the session is set
+# per request from app.py (use); calls made without one (e.g. the render pool's threads) work
+# as before. the bitsets take rows/8 bytes each, so all the sessions together are kept within
+# `budget` bytes by dropping the least recently used, and sessions idle for `idle` seconds are
+# dropped as well
+class SessionMasks:
+    def __init__(self, budget=64 * 2**20, idle=600):
+        self.enabled = budget > 0
+        self.budget = budget
+        self.idle = idle
+        self.size = 0 # bytes held
+        self.reused = 0 # predicates taken from a session's last selection
+        self.computed = 0 # ... and evaluated
+        self.evicted = 0
+        self._entries = OrderedDict() # (session, engine id) -> (last used, key, bitsets, bytes), LRU
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    # the session the current thread's calls are for (None: no session)
+    def use(self, session):
+        self._local.session = session if self.enabled else None
+
+    def current(self):
+        return getattr(self._local, 'session', None)
+
+    def get(self, engine):
+        session = self.current()
+        if session is None:
+            return None
+        with self._lock:
+            entry = self._entries.get((session, engine))
+            if entry is None:
+                return None
+            self._entries.move_to_end((session, engine))
+            return entry[1], entry[2]
+
+    def put(self, engine, key, bitsets, reused):
+        session = self.current()
+        if session is None:
+            return
+        size = sum(bitset.nbytes for bitset in bitsets if bitset is not None)
+        now = time.monotonic()
+        with self._lock:
+            self.reused += reused
+            self.computed += sum(bitset is not None for bitset in bitsets) - reused
+            old = self._entries.pop((session, engine), None)
+            if old is not None:
+                self.size -= old[3]
+            self._entries[(session, engine)] = (now, key, bitsets, size)
+            self.size += size
+            # least recently used first: drop those over the budget or idle for too long
+            while self._entries:
+                used, _, _, oldest = next(iter(self._entries.values()))
+                if self.size <= self.budget and now - used <= self.idle:
+                    break
+                self._entries.popitem(last=False)
+                self.size -= oldest
+                self.evicted += 1
+
+    def stats(self):
+        return {
+            'sessions': len({session for session, _ in self._entries}),
+            'bytes': self.size,
+            'reused': self.reused,
+            'computed': self.computed,
+            'evicted': self.evicted
+        }
+
+
+_engine_ids = itertools.count()
+
+
+class FilterEngine:
+    def __init__(self, df, maxsize=64, sessions=None):
+        self.df = df
+        self.maxsize = maxsize
+        self.sessions = sessions # SessionMasks, or None
+        self.id = next(_engine_ids)
+        self._results = OrderedDict() # small LRUs of key -> resolved rows (as frames, and positions)
+        self._rows = OrderedDict()
+        self._lock = threading.Lock()
+        # indexes are built once up front; every selection after that is just bitwise ANDs
+        self.indexes = {
+            'Title': BitmapIndex(df['Title']),
+            'Media': BitmapIndex(df['Media']),
+            'Device': BitmapIndex(df['Device']),
+            'startYear': BitmapIndex(df['startYear']),
+            'imgCount': SortedIndex(df['imgCount']),
+            'averageRating': SortedIndex(df['averageRating'])
+        }
+
+    # packed bitset per predicate of an already-normalized key (None where it doesn't filter),
+    # reusing the current session's last ones for the values which haven't changed
+    def bitsets(self, key):
+        last = self.sessions.get(self.id) if self.sessions is not None else None
+        bitsets = []
+        reused = 0
+        for i, ((column, is_range), value) in enumerate(zip(PREDICATES, key)):
+            if value is None:
+                bitsets.append(None)
+            elif last is not None and last[0][i] == value:
+                bitsets.append(last[1][i])
+                reused += 1
+            elif is_range:
+                bitsets.append(self.indexes[column].between(value[0], value[1]))
+            else:
+                bitsets.append(self.indexes[column].any_of(value))
+        if self.sessions is not None:
+            self.sessions.put(self.id, key, bitsets, reused)
+        return bitsets
+
+    # boolean mask (numpy array, aligned with self.df) for an already-normalized key
+    def mask(self, key):
+        bitsets = [bitset for bitset in self.bitsets(key) if bitset is not None]
+        if not bitsets:
+            return np.ones(len(self.df), dtype=bool)
+        return np.unpackbits(np.bitwise_and.reduce(bitsets), count=len(self.df)).astype(bool)
+
+    def clear(self):
+        with self._lock:
+            self._results.clear()
+            self._rows.clear()
+
+    # small LRU shared by rows() and resolve(): returns cache[key], building it on a miss
+    def _memo(self, cache, key, build):
+        with self._lock:
+            if key in cache:
+                cache.move_to_end(key)
+                return cache[key]
+        value = build()
+        with self._lock:
+            cache[key] = value
+            cache.move_to_end(key)
+            while len(cache) > self.maxsize:
+                cache.popitem(last=False)
+        return value
+
+    # positions (for iloc / numpy arrays) of the rows matching the selections
+    def rows(self, title=None, year=None, type=None, device=None, imgCount=None, rating=None):
+        key = normalize(title, year, type, device, imgCount, rating)
+        return self._memo(self._rows, key, lambda: np.flatnonzero(self.mask(key)))
+
+    # the rows matching the selections -- callers must treat the result as read-only,
+    # since the same frame is handed to every callback asking for this selection
+    def resolve(self, title=None, year=None, type=None, device=None, imgCount=None, rating=None):
+        key = normalize(title, year, type, device, imgCount, rating)
+        return self._memo(self._results, key, lambda: self.df.iloc[self.rows(*key)])
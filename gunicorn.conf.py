@@ -0,0 +1,31 @@
+# gunicorn settings (gunicorn reads this file from the working directory: `gunicorn app:server`)
+#
+# without preloading, every worker imports app.py itself, so each one reads the data and builds its
+# own filter indexes, rollup cube, title search and layout. with GUNICORN_PRELOAD=1 (the default)
+# the master imports the app once before forking and the workers share those pages copy-on-write.
+# the bulk of it is numpy buffers (or the memory-mapped snapshot), which nothing writes to. the
+# Python objects (titles, options, layout dicts) would still get copied once a full garbage
+# collection in a worker walks them, so the master moves everything it built into the gc's
+# permanent generation before the first fork.
+# the years the page opens on (DEFAULT_START_YEAR on) and the drill-down's tree are loaded here as
+# well, so they are shared too; other years are loaded by each worker when first selected.
+# a data reload in a worker builds that worker's own copy, as before.
+# measure it with `python benchmarks/bench_workers.py`
+#
+# workers (WEB_CONCURRENCY) and bind (PORT) keep gunicorn's own defaults
+import gc
+import os
+
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') == '1'
+
+
+# runs in the master once the app is loaded, before any worker is forked
+def when_ready(server):
+    if preload_app:
+        import app
+        app.plotting() # plotly express and the figure template, which app.py leaves until first use
+        if isinstance(app.backend, app.PartitionedBackend):
+            app.backend.partitions(app.default_years(app.meta))
+        app.drill()
+        gc.collect()
+        gc.freeze()
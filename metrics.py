@@ -0,0 +1,132 @@
+# per-callback instrumentation, exposed as Prometheus-style text on the Flask server
+#
+# each instrumented callback records its total time plus the time spent in named phases
+# (filtering, building the plotly figure, serializing it to JSON) and how many rows it worked
+# on. the numbers are served from /metrics, and every call can also be appended as a JSON line
+# to a trace file. when disabled, instrument() hands back the function untouched and phase()
+# returns a shared no-op context manager, so the callbacks pay next to nothing
+import functools
+import json
+import threading
+import time
+from contextlib import nullcontext
+
+
+BUCKETS = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5] # seconds
+NOOP = nullcontext()
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.counts[i] += 1
+
+
+class Metrics:
+    def __init__(self, enabled=False, trace_path=None):
+        self.enabled = enabled
+        self.trace_path = trace_path
+        self._lock = threading.Lock()
+        self._local = threading.local() # the call currently being recorded on this thread
+        self.seconds = {} # (callback, phase) -> Histogram
+        self.rows_total = {} # callback -> rows worked on, summed over calls
+        self.calls = {} # callback -> number of calls
+        self.collectors = [] # (name, help, function returning {label: value}) for extra gauges
+
+    # wrap a callback so each call is timed and (optionally) traced
+    def instrument(self, name):
+        def decorator(function):
+            if not self.enabled:
+                return function
+
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                record = {'callback': name, 'start': time.time(), 'phases': {}, 'rows': None}
+                self._local.record = record
+                started = time.perf_counter()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    record['phases']['total'] = time.perf_counter() - started
+                    self._local.record = None
+                    self._finish(record)
+            return wrapper
+        return decorator
+
+    # context manager timing one phase of the current call
+    def phase(self, name):
+        if not self.enabled or getattr(self._local, 'record', None) is None:
+            return NOOP
+        return self._Phase(self._local.record, name)
+
+    class _Phase:
+        def __init__(self, record, name):
+            self.record = record
+            self.name = name
+
+        def __enter__(self):
+            self.started = time.perf_counter()
+
+        def __exit__(self, *exc):
+            phases = self.record['phases']
+            phases[self.name] = phases.get(self.name, 0.0) + time.perf_counter() - self.started
+
+    # note how many rows the current call is working on
+    def rows(self, count):
+        if not self.enabled:
+            return
+        record = getattr(self._local, 'record', None)
+        if record is not None:
+            record['rows'] = int(count)
+
+    # report extra gauges (e.g. the figure cache's hit counts) alongside the callback metrics
+    def add_collector(self, name, help, collect):
+        self.collectors.append((name, help, collect))
+
+    def _finish(self, record):
+        name = record['callback']
+        with self._lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+            if record['rows'] is not None:
+                self.rows_total[name] = self.rows_total.get(name, 0) + record['rows']
+            for phase, seconds in record['phases'].items():
+                self.seconds.setdefault((name, phase), Histogram()).observe(seconds)
+            if self.trace_path:
+                with open(self.trace_path, 'a') as f:
+                    f.write(json.dumps(record) + '\n')
+
+    # everything above in the Prometheus text exposition format
+    def render(self):
+        lines = []
+        with self._lock:
+            lines.append('# HELP dash_callback_seconds Time spent in each callback, by phase')
+            lines.append('# TYPE dash_callback_seconds histogram')
+            for (name, phase), histogram in sorted(self.seconds.items()):
+                labels = f'callback="{name}",phase="{phase}"'
+                for bound, count in zip(BUCKETS, histogram.counts):
+                    lines.append(f'dash_callback_seconds_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f'dash_callback_seconds_bucket{{{labels},le="+Inf"}} {histogram.count}')
+                lines.append(f'dash_callback_seconds_sum{{{labels}}} {histogram.sum}')
+                lines.append(f'dash_callback_seconds_count{{{labels}}} {histogram.count}')
+            lines.append('# HELP dash_callback_calls_total Calls per callback')
+            lines.append('# TYPE dash_callback_calls_total counter')
+            for name, count in sorted(self.calls.items()):
+                lines.append(f'dash_callback_calls_total{{callback="{name}"}} {count}')
+            lines.append('# HELP dash_callback_rows_total Rows filtered/aggregated per callback, summed over calls')
+            lines.append('# TYPE dash_callback_rows_total counter')
+            for name, count in sorted(self.rows_total.items()):
+                lines.append(f'dash_callback_rows_total{{callback="{name}"}} {count}')
+        for name, help, collect in self.collectors:
+            lines.append(f'# HELP {name} {help}')
+            lines.append(f'# TYPE {name} gauge')
+            for label, value in collect().items():
+                lines.append(f'{name}{{stat="{label}"}} {value}')
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,76 @@
+# compact copy of the data for clientside mode (CLIENTSIDE_MODE=1)
+#
+# in clientside mode the browser downloads the columns the pie and line charts need once, and
+# filters/aggregates them itself in assets/clientside.js, instead of asking the server on every
+# widget change. strings are dictionary-encoded (a list of categories + an integer code per
+# row) and the whole payload is gzipped once up front and served with an ETag, so a returning
+# browser only gets a 304. it also carries "skeletons" of the server's figures -- the layout
+# and trace styling plotly express produces -- so the browser only has to fill in the numbers
+import gzip
+import hashlib
+import json
+
+import numpy as np
+from flask import Response
+
+
+CATEGORICAL = ['Title', 'Media', 'Device']
+NUMERIC = ['startYear', 'imgCount', 'averageRating']
+
+
+def encode(df):
+    columns = {}
+    for name in CATEGORICAL:
+        categories, codes = np.unique(df[name].to_numpy(), return_inverse=True)
+        columns[name] = {'categories': categories.tolist(), 'codes': codes.tolist()}
+    for name in NUMERIC:
+        columns[name] = df[name].tolist()
+    return columns
+
+
+# the first trace of a line figure with its device name swapped for a placeholder, and its data
+# and color removed
+def trace_skeleton(figure):
+    trace = json.loads(json.dumps(figure['data'][0]))
+    name = trace['name']
+    for field in ['x', 'y']:
+        trace.pop(field, None)
+    trace['line'].pop('color', None)
+    trace['name'] = trace['legendgroup'] = '{device}'
+    trace['hovertemplate'] = trace['hovertemplate'].replace('Device=' + name + '<br>', 'Device={device}<br>', 1)
+    return trace
+
+
+# pie_figure: any pie_devices() figure; line_figures: line_device_time() figure for each radio value
+def skeletons(pie_figure, line_figures, colors):
+    pie_trace = dict(pie_figure['data'][0])
+    pie_trace.pop('labels', None)
+    pie_trace.pop('values', None)
+    return {
+        'pie': {'layout': pie_figure['layout'], 'trace': pie_trace},
+        'line': {how: {'layout': figure['layout'], 'trace': trace_skeleton(figure)}
+                 for how, figure in line_figures.items()},
+        'colors': colors
+    }
+
+
+class Payload:
+    def __init__(self, df, figures, version=None):
+        body = json.dumps({'version': version, 'rows': len(df), 'columns': encode(df), 'figures': figures},
+                          separators=(',', ':')).encode()
+        self.etag = hashlib.sha1(body).hexdigest()
+        self.body = body
+        self.gzipped = gzip.compress(body, compresslevel=9)
+
+    def response(self, request):
+        if self.etag in request.if_none_match:
+            response = Response(status=304)
+        elif 'gzip' in request.accept_encodings:
+            response = Response(self.gzipped, mimetype='application/json')
+            response.headers['Content-Encoding'] = 'gzip'
+        else:
+            response = Response(self.body, mimetype='application/json')
+        response.set_etag(self.etag)
+        response.headers['Vary'] = 'Accept-Encoding'
+        response.headers['Cache-Control'] = 'no-cache' # always revalidate, which is just a 304
+        return response
@@ -0,0 +1,296 @@
+# data pipeline: data/placements.csv (raw Kaggle data) -> data/data.csv (what the app reads)
+#
+# this is the cleaning from data/data-cleaning.ipynb as a re-runnable script, so a data refresh
+# doesn't need the notebook. the steps are the same -- fill nulls with -1, drop `Page`, drop
+# duplicate rows, then "melt" the Movie/Show and device indicator columns into `Media` and
+# `Device` -- but the input is read in chunks and the melt is done with NumPy straight from the
+# indicator columns, so there is never a full-width melted frame (let alone two) in memory.
+# the output matches the notebook's row for row, and the columnar snapshot is rebuilt after.
+#
+# new placement records can also be appended to an existing data/data.csv without re-running
+# the whole thing; the running app notices the change and swaps the new data in on its own.
+#
+# averageRating, numVotes and startYear are as IMDb had them when the Kaggle data was scraped.
+# --enrich refreshes them from local copies of IMDb's bulk files (title.ratings.tsv.gz and
+# title.basics.tsv.gz from https://datasets.imdbws.com, in data/imdb/). the files have tens of
+# millions of rows, so they are never loaded: our tconsts (a few hundred to thousands) are the
+# hash index, and the files stream past it a chunk at a time, keeping only the rows it matches.
+# the values found are kept next to the files (enriched.json) with the files' size/mtime, so a
+# re-run only reads the files again once they have been replaced, or for tconsts it hasn't
+# looked up yet; and data/data.csv is only rewritten when some title's values actually changed,
+# for the rows of those titles.
+#
+# usage: python pipeline.py [--src data/placements.csv] [--out data/data.csv] [--chunksize N]
+#        python pipeline.py --append new-placements.csv
+#        python pipeline.py --enrich [--imdb-dir data/imdb]
+import argparse
+import csv
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+import snapshot
+
+
+SRC_PATH = 'data/placements.csv'
+OUT_PATH = snapshot.CSV_PATH
+CHUNKSIZE = 100_000
+
+MEDIA = ['Movie', 'Show']
+DEVICES = ['iPhone', 'iPad', 'iMac', 'MacBook', 'macOS', 'AirPods', 'Apple Watch']
+DROPPED = ['Page'] # no discernible meaning
+# a cleaned row is one device in one movie/episode, and is identified by these columns
+KEY = ['tconst', 'Season', 'Episode', 'Device', 'imgCount']
+KEY_DTYPES = {'Season': 'float64', 'Episode': 'float64', 'imgCount': 'int64'}
+# fixed dtypes, so every chunk parses (and is written back out) the same way
+DTYPES = {'Season': 'float64', 'Episode': 'float64', 'averageRating': 'float64'}
+
+IMDB_DIR = 'data/imdb'
+IMDB_CHUNKSIZE = 500_000
+# the columns refreshed from IMDb, and the bulk file (and its columns) each comes from
+ENRICHED = ['averageRating', 'numVotes', 'startYear']
+DUMPS = {
+    'title.ratings.tsv.gz': ['tconst', 'averageRating', 'numVotes'],
+    'title.basics.tsv.gz': ['tconst', 'startYear']
+}
+ENRICHED_STATE = 'enriched.json'
+
+
+# fill nulls (Season/Episode for movies) with -1 and drop the unused columns
+def clean(chunk):
+    return chunk.fillna(-1).drop(columns=DROPPED, errors='ignore')
+
+
+# drop rows already seen, in this chunk or an earlier one. rows are compared by a 64 bit hash
+# of all their values, held in `seen`, rather than keeping every earlier row around
+def drop_seen(chunk, seen):
+    hashes = pd.util.hash_pandas_object(chunk, index=False).to_numpy()
+    keep = ~pd.Series(hashes).duplicated().to_numpy()
+    keep &= np.array([h not in seen for h in hashes.tolist()], dtype=bool)
+    seen.update(hashes[keep].tolist())
+    return chunk[keep]
+
+
+# one output row per (row, media, device) whose indicators are both 1, as a list of
+# ((media, device), frame) pieces in the same order pd.melt would produce them
+def melt(chunk):
+    id_cols = [col for col in chunk.columns if col not in MEDIA and col not in DEVICES]
+    base = chunk[id_cols]
+    media = chunk[MEDIA].to_numpy() == 1
+    devices = chunk[DEVICES].to_numpy() == 1
+    pieces = []
+    for d, device in enumerate(DEVICES):
+        for m, medium in enumerate(MEDIA):
+            rows = np.flatnonzero(media[:, m] & devices[:, d])
+            if len(rows) == 0:
+                continue
+            piece = base.iloc[rows].assign(Media=medium, Device=device)
+            pieces.append(((medium, device), piece))
+    return pieces
+
+
+# the whole transform for a frame that fits in memory (also used when ingesting new rows)
+def transform(df, seen=None):
+    df = drop_seen(clean(df), set() if seen is None else seen)
+    pieces = [piece for _, piece in melt(df)]
+    if not pieces:
+        columns = [col for col in df.columns if col not in MEDIA and col not in DEVICES]
+        return pd.DataFrame(columns=columns + ['Media', 'Device'])
+    return pd.concat(pieces, ignore_index=True)
+
+
+# 64 bit hashes of the key columns, one per cleaned row
+def key_hashes(df):
+    return pd.util.hash_pandas_object(df[KEY].astype(KEY_DTYPES), index=False).to_numpy()
+
+
+# hash index over the keys already in a cleaned CSV (only the key columns are read)
+def existing_keys(path=OUT_PATH, chunksize=CHUNKSIZE):
+    keys = set()
+    if os.path.exists(path):
+        for chunk in pd.read_csv(path, usecols=KEY, chunksize=chunksize, low_memory=False):
+            keys.update(key_hashes(chunk).tolist())
+    return keys
+
+
+# clean new rows in the placements.csv schema and append the ones whose key isn't stored yet.
+# the cleaned CSV is swapped in with a single rename, so the app never reads a half-written file
+def append(src, out=OUT_PATH, chunksize=CHUNKSIZE, build_snapshot=True):
+    keys = existing_keys(out, chunksize)
+    seen = set()
+    rows = 0
+    tmp = out + '.tmp'
+    shutil.copyfile(out, tmp)
+    try:
+        for chunk in pd.read_csv(src, chunksize=chunksize, dtype=DTYPES, low_memory=False):
+            new = transform(chunk, seen)
+            hashes = key_hashes(new)
+            keep = ~pd.Series(hashes).duplicated().to_numpy()
+            keep &= np.array([h not in keys for h in hashes.tolist()], dtype=bool)
+            keys.update(hashes[keep].tolist())
+            new[keep].to_csv(tmp, mode='a', header=False, index=False)
+            rows += int(keep.sum())
+        if rows:
+            os.replace(tmp, out)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    if build_snapshot and rows:
+        snapshot.build(out)
+    return rows
+
+
+# IMDb's files are tab-separated with \N for missing values and no quoting (titles may contain quotes)
+def read_dump(path, columns, chunksize=IMDB_CHUNKSIZE):
+    return pd.read_csv(path, sep='\t', usecols=columns, dtype=str, na_values=['\\N'], keep_default_na=False,
+                       quoting=csv.QUOTE_NONE, chunksize=chunksize)
+
+
+# IMDb's current values for the given tconsts: a hash join with our tconsts as the build side and
+# the bulk files streamed through as the probe side. {tconst: [averageRating, numVotes, startYear]},
+# None where IMDb has no value; tconsts IMDb doesn't list at all get all Nones
+def imdb_lookup(tconsts, imdb_dir=IMDB_DIR, chunksize=IMDB_CHUNKSIZE):
+    wanted = pd.Index(sorted(tconsts)) # isin() probes it as a hash table
+    found = []
+    for name, columns in DUMPS.items():
+        matched = [chunk[chunk['tconst'].isin(wanted).to_numpy()]
+                   for chunk in read_dump(os.path.join(imdb_dir, name), columns, chunksize)]
+        found.append(pd.concat(matched).drop_duplicates('tconst').set_index('tconst'))
+    found = pd.concat(found, axis=1).reindex(wanted)[ENRICHED]
+    values = {}
+    for tconst, rating, votes, year in found.itertuples(name=None):
+        values[tconst] = [None if pd.isna(rating) else float(rating),
+                          None if pd.isna(votes) else int(votes),
+                          None if pd.isna(year) else int(year)]
+    return values
+
+
+# the distinct (tconst, averageRating, numVotes, startYear) in a cleaned CSV
+def current_values(path=OUT_PATH, chunksize=CHUNKSIZE):
+    pieces = [chunk.drop_duplicates() for chunk in
+              pd.read_csv(path, usecols=['tconst'] + ENRICHED, dtype=DTYPES, chunksize=chunksize, low_memory=False)]
+    return pd.concat(pieces, ignore_index=True).drop_duplicates()
+
+
+# the tconsts whose rows don't all have IMDb's values (where IMDb has one)
+def changed_tconsts(current, values):
+    changed = set()
+    for tconst, *old in current[['tconst'] + ENRICHED].itertuples(index=False, name=None):
+        new = values.get(tconst)
+        if new is not None and any(n is not None and n != o for n, o in zip(new, old)):
+            changed.add(tconst)
+    return changed
+
+
+# rewrite a cleaned CSV with IMDb's values for the rows of the given tconsts, swapped in with a rename
+def apply_values(values, out=OUT_PATH, chunksize=CHUNKSIZE):
+    updates = pd.DataFrame.from_dict(values, orient='index', columns=ENRICHED)
+    tmp = out + '.tmp'
+    try:
+        header = True
+        for chunk in pd.read_csv(out, chunksize=chunksize, dtype=DTYPES, low_memory=False):
+            new = updates.reindex(chunk['tconst'].to_numpy())
+            for column in ENRICHED:
+                replace = new[column].notna().to_numpy()
+                if replace.any():
+                    chunk.loc[replace, column] = new[column][replace].astype(chunk[column].dtype).to_numpy()
+            chunk.to_csv(tmp, mode='w' if header else 'a', header=header, index=False)
+            header = False
+        os.replace(tmp, out)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+# refresh averageRating/numVotes/startYear in a cleaned CSV from IMDb's bulk files; returns the
+# number of titles whose values changed (0: the CSV was left alone)
+def enrich(out=OUT_PATH, imdb_dir=IMDB_DIR, chunksize=CHUNKSIZE, build_snapshot=True):
+    for name in DUMPS:
+        if not os.path.exists(os.path.join(imdb_dir, name)):
+            raise FileNotFoundError(f'{os.path.join(imdb_dir, name)} is missing (download it from https://datasets.imdbws.com)')
+    dumps = {name: snapshot.source_stamp(os.path.join(imdb_dir, name)) for name in DUMPS}
+    state_path = os.path.join(imdb_dir, ENRICHED_STATE)
+    state = {}
+    if os.path.exists(state_path):
+        with open(state_path) as f:
+            state = json.load(f)
+    # what was found last time still holds as long as the files are the same ones
+    values = state.get('values', {}) if state.get('dumps') == dumps else {}
+    current = current_values(out, chunksize)
+    missing = set(current['tconst']) - values.keys()
+    if missing:
+        values.update(imdb_lookup(missing, imdb_dir))
+    changed = changed_tconsts(current, values)
+    if changed:
+        apply_values({tconst: values[tconst] for tconst in changed}, out, chunksize)
+    tmp = state_path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump({'dumps': dumps, 'values': values}, f)
+    os.replace(tmp, state_path)
+    if build_snapshot and changed:
+        snapshot.build(out)
+    return len(changed)
+
+
+def run(src=SRC_PATH, out=OUT_PATH, chunksize=CHUNKSIZE, build_snapshot=True):
+    seen = set()
+    rows = 0
+    columns = None
+    # pd.melt orders its output by device, then media, then input row -- so each (device, media)
+    # bucket is spooled to its own temp file and the buckets are stitched together at the end
+    spool = tempfile.mkdtemp(dir=os.path.dirname(os.path.abspath(out)))
+    try:
+        buckets = {(medium, device): os.path.join(spool, f'{d}-{m}.csv')
+                   for d, device in enumerate(DEVICES) for m, medium in enumerate(MEDIA)}
+        for chunk in pd.read_csv(src, chunksize=chunksize, dtype=DTYPES, low_memory=False):
+            chunk = drop_seen(clean(chunk), seen)
+            for bucket, piece in melt(chunk):
+                columns = list(piece.columns)
+                piece.to_csv(buckets[bucket], mode='a', header=False, index=False)
+                rows += len(piece)
+        tmp = os.path.join(spool, 'out.csv')
+        with open(tmp, 'w', newline='') as f:
+            if columns is not None:
+                f.write(','.join(columns) + '\n')
+            for d, device in enumerate(DEVICES):
+                for m, medium in enumerate(MEDIA):
+                    if os.path.exists(buckets[(medium, device)]):
+                        with open(buckets[(medium, device)]) as bucket:
+                            shutil.copyfileobj(bucket, f)
+        os.replace(tmp, out)
+    finally:
+        shutil.rmtree(spool, ignore_errors=True)
+    if build_snapshot:
+        snapshot.build(out)
+    return rows
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Clean the raw placements data into the file the dashboard reads.')
+    parser.add_argument('--src', default=SRC_PATH, help='raw placements CSV')
+    parser.add_argument('--out', default=OUT_PATH, help='cleaned CSV to write')
+    parser.add_argument('--chunksize', type=int, default=CHUNKSIZE, help='rows of the raw CSV to process at a time')
+    parser.add_argument('--append', metavar='CSV', help='append the new rows in this raw CSV to --out instead of rebuilding it')
+    parser.add_argument('--enrich', action='store_true',
+                        help='refresh averageRating/numVotes/startYear in --out from the IMDb files in --imdb-dir '
+                             '(after --append, if given; on its own, nothing is re-cleaned)')
+    parser.add_argument('--imdb-dir', default=IMDB_DIR, help='where title.ratings.tsv.gz and title.basics.tsv.gz are')
+    parser.add_argument('--no-snapshot', action='store_true', help="don't rebuild the columnar snapshot afterwards")
+    args = parser.parse_args()
+    build = not args.no_snapshot
+    rows = 0
+    if args.append:
+        rows = append(args.append, args.out, args.chunksize, build and not args.enrich)
+        print(f'appended {rows} new rows to {args.out}')
+    elif not args.enrich:
+        rows = run(args.src, args.out, args.chunksize, build)
+        print(f'wrote {rows} rows to {args.out}')
+    if args.enrich:
+        changed = enrich(args.out, args.imdb_dir, args.chunksize, build_snapshot=False)
+        print(f'refreshed {changed} titles in {args.out} from {args.imdb_dir}')
+        if build and (rows or changed):
+            snapshot.build(args.out)
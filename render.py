@@ -0,0 +1,64 @@
+# renders the other charts for a selection in the background (FIGURE_WORKERS=n)
+#
+# a filter change fires the pie, scatter and line callbacks as three separate requests, which a
+# single-threaded worker then answers one after another. with a pool, the first of them to
+# arrive also starts the other two on the pool's threads; they land in the figure cache, and a
+# sibling request that arrives while its figure is still being built joins that computation
+# (the cache's single-flight) instead of starting its own. the threads share the data read-only,
+# and the filtering/aggregation is mostly numpy, which runs outside the GIL
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class RenderPool:
+    def __init__(self, workers=0):
+        self.workers = workers
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix='render') if workers else None
+        self.charts = {} # name -> memoized figure function
+        self.extra = {} # name -> the extra (non-filter) arguments of its latest call
+        self.pending = 0
+        self.submitted = 0
+        self._lock = threading.Lock()
+
+    # decorator for a memoized chart function. extra: its arguments after the six filters, as
+    # they start out in the layout (e.g. the line chart's radio button); the latest ones seen
+    # are used when it is rendered for another chart's request
+    def fan_out(self, name, extra=()):
+        def decorator(function):
+            self.charts[name] = function
+            self.extra[name] = tuple(extra)
+            if self.executor is None:
+                return function
+
+            @functools.wraps(function)
+            def wrapper(*args):
+                filters = args[:len(args) - len(self.extra[name])]
+                self.extra[name] = args[len(filters):]
+                for other, build in self.charts.items():
+                    if other != name:
+                        self.submit(build, *filters, *self.extra[other])
+                return function(*args)
+            return wrapper
+        return decorator
+
+    # queue a figure unless the pool is already busy, e.g. with the tail of a slider drag
+    def submit(self, build, *args):
+        with self._lock:
+            if self.pending >= self.workers:
+                return
+            self.pending += 1
+            self.submitted += 1
+        self.executor.submit(self._run, build, args)
+
+    def _run(self, build, args):
+        try:
+            build(*args)
+        except Exception:
+            pass # the chart's own request will compute it (and report the error) itself
+        finally:
+            with self._lock:
+                self.pending -= 1
+
+    def stats(self):
+        return {'workers': self.workers, 'pending': self.pending, 'submitted': self.submitted}
@@ -0,0 +1,84 @@
+# pre-aggregated rollups for the pie and line charts
+#
+# both charts only ever group by startYear and/or Device, so the data is rolled up once, at
+# load, to one row per (startYear, Media, Device) holding the row count and the imgCount and
+# averageRating sums. as long as the only narrowed filters are the coarse ones (year, media,
+# device) -- which is the case for most interactions -- the charts are answered from that cube
+# (a few hundred rows at most) without touching the raw rows. once Title, imgCount or rating
+# are narrowed, the cube can't tell which rows are left, and the callers fall back to the rows
+import numpy as np
+
+from filters import normalize
+
+
+DIMENSIONS = ['startYear', 'Media', 'Device']
+
+
+class RollupCube:
+    def __init__(self, df):
+        # imgCount summed as int64, whatever (narrower) dtype the column is held in
+        rows = df[DIMENSIONS].assign(imgCount=df['imgCount'].astype(np.int64), averageRating=df['averageRating'])
+        self.cube = rows.groupby(DIMENSIONS, observed=True).agg(
+            rows=('imgCount', 'size'),
+            imgCount_sum=('imgCount', 'sum'),
+            rating_sum=('averageRating', 'sum'),
+            rating_count=('averageRating', 'count')
+        ).reset_index()
+        # a range filter which includes every value is no filter at all
+        self.imgCount_range = (df['imgCount'].min(), df['imgCount'].max())
+        self.rating_range = (df['averageRating'].min(), df['averageRating'].max())
+        self.rating_has_nulls = bool(df['averageRating'].isna().any()) # never pass a range filter
+
+    # whether the selection only narrows the dimensions the cube keeps
+    def covers(self, key):
+        title, year, type, device, imgCount, rating = key
+        if title is not None:
+            return False
+        if imgCount is not None and not (imgCount[0] <= self.imgCount_range[0] and imgCount[1] >= self.imgCount_range[1]):
+            return False
+        if rating is not None and (self.rating_has_nulls or
+                                   not (rating[0] <= self.rating_range[0] and rating[1] >= self.rating_range[1])):
+            return False
+        return True
+
+    # cube rows for the selection, or None when the raw rows are needed (or nothing matches)
+    def select(self, title, year, type, device, imgCount, rating):
+        key = normalize(title, year, type, device, imgCount, rating)
+        if not self.covers(key):
+            return None
+        _, year, type, device, _, _ = key
+        cube = self.cube
+        mask = np.ones(len(cube), dtype=bool)
+        if year is not None:
+            mask &= ((cube['startYear'] >= year[0]) & (cube['startYear'] <= year[1])).to_numpy()
+        if type is not None:
+            mask &= cube['Media'].isin(type).to_numpy()
+        if device is not None:
+            mask &= cube['Device'].isin(device).to_numpy()
+        if not mask.any():
+            return None
+        return cube[mask]
+
+    # same frame as resolved_df.groupby(['Device'])['Device'].count().reset_index(name='count')
+    def device_counts(self, *filters):
+        cube = self.select(*filters)
+        if cube is None:
+            return None
+        return cube.groupby('Device', observed=True)['rows'].sum().reset_index(name='count')
+
+    # same frame as grouping the rows by startYear and Device, with imgCount aggregated by
+    # `how` ('count', 'sum' or 'mean') and averageRating by its mean
+    def device_years(self, *filters, how='mean'):
+        cube = self.select(*filters)
+        if cube is None:
+            return None
+        totals = cube.groupby(['startYear', 'Device'], observed=True)[['rows', 'imgCount_sum', 'rating_sum', 'rating_count']].sum()
+        if how == 'count':
+            imgCount = totals['rows']
+        elif how == 'sum':
+            imgCount = totals['imgCount_sum']
+        else:
+            imgCount = totals['imgCount_sum'] / totals['rows']
+        totals['imgCount'] = imgCount
+        totals['averageRating'] = totals['rating_sum'] / totals['rating_count']
+        return totals[['imgCount', 'averageRating']].reset_index()
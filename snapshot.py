@@ -0,0 +1,267 @@
+# columnar snapshot of the cleaned data, so workers don't parse the CSV at startup
+#
+# `python snapshot.py` reads data/data.csv once and writes it partitioned by startYear: a
+# year=YYYY/ directory per year, holding one .npy file per column (strings are
+# dictionary-encoded as integer codes, against one set of categories shared by every year),
+# plus a meta.json holding the categories, each year's row count and everything the layout
+# needs up front: the dropdown options and the slider ranges/marks. the app memory-maps a
+# year's columns read-only only once a selection includes that year (see PartitionedBackend in
+# backends.py), so the OS loads them lazily and every gunicorn worker on the machine shares the
+# same pages
+import argparse
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+
+
+CSV_PATH = os.environ.get('DATA_CSV', 'data/data.csv')
+SNAPSHOT_DIR = os.environ.get('DATA_SNAPSHOT_DIR', 'data/snapshot')
+# the year slider covers the whole history but starts out at DEFAULT_START_YEAR-latest, so the
+# older years are only loaded once someone selects them
+DEFAULT_START_YEAR = int(os.environ.get('DEFAULT_START_YEAR', 2020))
+FORMAT = 2 # partitioned by year; bumped whenever the layout on disk changes
+
+# the dtypes the app holds each column in. repeated strings become categoricals (an integer code
+# per row plus one copy of each distinct string), Season/Episode become nullable small ints (the
+# CSV stores them as floats, -1 marking a movie), and the other ints shrink to what their values
+# need. averageRating stays float64: in float32 a rating like 6.4 is no longer 6.4, and the
+# means and figures would change
+SCHEMA = {
+    'tconst': 'category',
+    'Title': 'category',
+    'Season': 'Int16',
+    'Episode': 'Int16',
+    'imgCount': 'int32',
+    'averageRating': 'float64',
+    'numVotes': 'int32',
+    'startYear': 'int16',
+    'Media': 'category',
+    'Device': 'category'
+}
+
+
+# everything the layout precomputes (dropdown options, slider bounds and marks), from the distinct
+# titles/media/devices in order of first appearance and the sorted distinct years and imgCounts
+def layout(titles, media, devices, years, img_counts):
+    step = 1 if years[-1] - years[0] <= 10 else 5 # a mark per year until they'd crowd the slider
+    marks = sorted({years[0], years[-1]} | set(range(years[0] + (-years[0]) % step, years[-1]+1, step)))
+    return {
+        'titles': titles,
+        'media': media,
+        'devices': devices,
+        'year': {
+            'min': years[0],
+            'max': years[-1],
+            'marks': {i: '{}'.format(i) for i in marks}
+        },
+        'imgCount': {
+            'min': img_counts[0],
+            'max': img_counts[-1],
+            'marks': {i: '{}'.format(i) for i in range(img_counts[0]-1, img_counts[-1]+1, 10)}
+        }
+    }
+
+
+# the year slider's starting selection
+def default_years(layout):
+    low, high = layout['year']['min'], layout['year']['max']
+    return [min(max(DEFAULT_START_YEAR, low), high), high]
+
+
+def describe(df):
+    return layout(
+        df['Title'].unique().tolist(),
+        df['Media'].unique().tolist(),
+        df['Device'].unique().tolist(),
+        np.sort(df['startYear'].unique()).tolist(),
+        np.sort(df['imgCount'].unique()).tolist()
+    )
+
+
+# df with SCHEMA applied; an integer column whose values don't fit its dtype keeps the one it has
+def compact(df):
+    dtypes = {}
+    for name, dtype in SCHEMA.items():
+        if name not in df.columns:
+            continue
+        kind = pd.api.types.pandas_dtype(dtype)
+        if kind.kind in 'iu' and len(df):
+            limits = np.iinfo(getattr(kind, 'numpy_dtype', kind))
+            if df[name].min() < limits.min or df[name].max() > limits.max:
+                continue
+        dtypes[name] = dtype
+    return df.astype(dtypes)
+
+
+def read_csv(csv_path=CSV_PATH):
+    # strings are parsed straight into categoricals, so the full column of str objects never exists
+    categorical = {name: dtype for name, dtype in SCHEMA.items() if dtype == 'category'}
+    df = pd.read_csv(csv_path, low_memory=False, dtype=categorical)
+    return compact(df)
+
+
+# identifies the CSV a snapshot was built from, so a stale snapshot is never loaded
+def source_stamp(csv_path):
+    stat = os.stat(csv_path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def save_columns(df, directory):
+    os.makedirs(directory, exist_ok=True)
+    np.save(os.path.join(directory, '_index.npy'), df.index.to_numpy())
+    for name in df.columns:
+        column = df[name]
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            np.save(os.path.join(directory, name + '.npy'), column.cat.codes.to_numpy())
+        elif isinstance(column.dtype, pd.api.extensions.ExtensionDtype) and column.dtype.kind in 'iu':
+            # nullable ints: the values plus a mask of the missing ones
+            np.save(os.path.join(directory, name + '.npy'), column.to_numpy(column.dtype.numpy_dtype, na_value=0))
+            np.save(os.path.join(directory, name + '.mask.npy'), column.isna().to_numpy())
+        else:
+            np.save(os.path.join(directory, name + '.npy'), column.to_numpy())
+
+
+def describe_columns(df):
+    columns = []
+    for name in df.columns:
+        dtype = df[name].dtype
+        if isinstance(dtype, pd.CategoricalDtype):
+            columns.append({'name': name, 'kind': 'categorical', 'categories': dtype.categories.tolist()})
+        elif isinstance(dtype, pd.api.extensions.ExtensionDtype) and dtype.kind in 'iu':
+            columns.append({'name': name, 'kind': 'nullable'})
+        else:
+            columns.append({'name': name, 'kind': 'numeric'})
+    return columns
+
+
+def build(csv_path=CSV_PATH, directory=SNAPSHOT_DIR):
+    df = read_csv(csv_path)
+    for name in df.columns:
+        if df[name].dtype == object or pd.api.types.is_string_dtype(df[name].dtype):
+            df[name] = df[name].astype('category') # a column outside SCHEMA: dictionary-encode it too
+    previous = current_data(directory)
+    # every build goes to a new directory: a worker still on the previous build may yet load one
+    # of its years, so that one is kept (and older ones removed) until the next build
+    data = 'data-{}'.format(time.time_ns())
+    positions = df.groupby('startYear').indices
+    for year, rows in positions.items():
+        save_columns(df.iloc[rows], os.path.join(directory, data, 'year={}'.format(year)))
+    meta = {
+        'source': source_stamp(csv_path),
+        'format': FORMAT,
+        'schema': SCHEMA,
+        'data': data,
+        'rows': len(df),
+        'partitions': {str(year): len(rows) for year, rows in positions.items()},
+        'columns': describe_columns(df),
+        'layout': describe(df)
+    }
+    # meta.json goes last (and atomically), since its presence is what marks a complete snapshot
+    with open(os.path.join(directory, 'meta.json.tmp'), 'w') as f:
+        json.dump(meta, f)
+    os.replace(os.path.join(directory, 'meta.json.tmp'), os.path.join(directory, 'meta.json'))
+    for name in os.listdir(directory):
+        if name.startswith('data-') and name not in (data, previous):
+            shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+    return meta
+
+
+def current_data(directory):
+    try:
+        with open(os.path.join(directory, 'meta.json')) as f:
+            return json.load(f).get('data')
+    except (OSError, ValueError):
+        return None
+
+
+# the snapshot's years, each read from disk (memory-mapped) only when asked for
+class SnapshotStore:
+    def __init__(self, directory, meta):
+        self.directory = os.path.join(directory, meta['data'])
+        self.rows = {int(year): rows for year, rows in meta['partitions'].items()}
+        self.years = sorted(self.rows)
+        self.columns = meta['columns']
+        # one dtype per categorical column, shared by every year so they concatenate as categoricals
+        self.dtypes = {column['name']: pd.CategoricalDtype(column['categories'])
+                       for column in self.columns if column['kind'] == 'categorical'}
+        self.layout = meta['layout']
+
+    # the rows of one year (only the given columns, if any)
+    def load(self, year, columns=None):
+        directory = os.path.join(self.directory, 'year={}'.format(year))
+        data = {}
+        for column in self.columns:
+            name = column['name']
+            if columns is not None and name not in columns:
+                continue
+            values = np.load(os.path.join(directory, name + '.npy'), mmap_mode='r')
+            if column['kind'] == 'categorical':
+                data[name] = pd.Categorical.from_codes(values, dtype=self.dtypes[name])
+            elif column['kind'] == 'nullable':
+                mask = np.load(os.path.join(directory, name + '.mask.npy'))
+                data[name] = pd.arrays.IntegerArray(values, mask)
+            else:
+                data[name] = values
+        index = pd.Index(np.load(os.path.join(directory, '_index.npy')))
+        return pd.DataFrame(data, index=index, copy=False)
+
+    # the given columns of every year, in the CSV's row order
+    def frame(self, columns):
+        parts = [self.load(year, columns)[columns] for year in self.years]
+        return pd.concat(parts).sort_index(kind='stable')
+
+
+# the same for a frame already in memory (read from the CSV)
+class FrameStore:
+    def __init__(self, df):
+        self.df = df
+        self.positions = df.groupby('startYear').indices
+        self.rows = {int(year): len(rows) for year, rows in self.positions.items()}
+        self.years = sorted(self.rows)
+        self.layout = describe(df)
+
+    def load(self, year, columns=None):
+        part = self.df.iloc[self.positions[year]]
+        return part if columns is None else part[columns]
+
+    def frame(self, columns):
+        return self.df[columns]
+
+
+# the snapshot's store, or None when it is missing or out of date
+def load(csv_path=CSV_PATH, directory=SNAPSHOT_DIR):
+    try:
+        with open(os.path.join(directory, 'meta.json')) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if meta.get('format') != FORMAT or meta.get('schema') != SCHEMA:
+        return None
+    if os.path.exists(csv_path) and meta['source'] != source_stamp(csv_path):
+        return None
+    layout = meta['layout']
+    # JSON only has string keys, but the sliders want numeric marks
+    for slider in ['year', 'imgCount']:
+        layout[slider]['marks'] = {int(i): label for i, label in layout[slider]['marks'].items()}
+    return SnapshotStore(directory, meta)
+
+
+# what the app calls: the snapshot when there is a fresh one, otherwise the CSV
+def load_data(csv_path=CSV_PATH, directory=SNAPSHOT_DIR):
+    store = load(csv_path, directory)
+    if store is not None:
+        return store
+    return FrameStore(read_csv(csv_path))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build the columnar data snapshot the dashboard loads at startup.')
+    parser.add_argument('--csv', default=CSV_PATH, help='cleaned data to snapshot')
+    parser.add_argument('--out', default=SNAPSHOT_DIR, help='directory to write the snapshot to')
+    args = parser.parse_args()
+    meta = build(args.csv, args.out)
+    print(f"wrote {meta['rows']} rows x {len(meta['columns'])} columns in {len(meta['partitions'])} years to {args.out}")
@@ -0,0 +1,105 @@
+# title search for the title dropdown
+#
+# sending every matching title to the dropdown on each media/year change (and all of them with
+# the page) doesn't scale with the catalog, so the dropdown instead asks for what has been typed
+# into it (search_value) and gets back the first matches, capped at a limit; typing more narrows
+# them down. the titles are indexed once, at load:
+#   - prefix matches: the lowercased titles in sorted order, so a prefix is a range found by
+#     binary search
+#   - substring matches: all lowercased titles joined into one string and scanned in one go,
+#     each hit mapped back to its title by the offsets
+#   - which titles a media/year selection leaves (in order of first appearance, as
+#     df['Title'].unique() lists them) from a table of each title's first row per
+#     (Media, startYear), memoized per selection
+# prefix matches are listed first, then the other substring matches
+import re
+import threading
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+
+class TitleSearch:
+    def __init__(self, df, limit=100, maxsize=256):
+        self.limit = limit
+        self.maxsize = maxsize
+        codes, titles = pd.factorize(df['Title'])
+        self.titles = np.asarray(titles, dtype=object) # in order of first appearance
+        # first row of each title in each (Media, startYear)
+        first = pd.DataFrame({
+            'title': codes,
+            'Media': df['Media'].to_numpy(),
+            'startYear': df['startYear'].to_numpy(),
+            'row': np.arange(len(df))
+        })
+        first = first[first['title'] >= 0].groupby(['title', 'Media', 'startYear'], observed=True)['row'].min()
+        self.first = first.reset_index().sort_values('row')
+        lower = [str(title).lower() for title in self.titles]
+        self.by_name = np.argsort(np.asarray(lower, dtype=object), kind='stable')
+        self.sorted_lower = [lower[i] for i in self.by_name]
+        self.haystack = '\n'.join(lower)
+        self.starts = np.cumsum([0] + [len(name) + 1 for name in lower])[:-1]
+        self._candidates = OrderedDict() # (media, year) -> title ids, LRU
+        self._lock = threading.Lock()
+
+    # title ids left by a media/year selection, in order of first appearance
+    def candidates(self, media, year):
+        key = (tuple(sorted(media)) if media else None, tuple(year) if year else None)
+        with self._lock:
+            if key in self._candidates:
+                self._candidates.move_to_end(key)
+                return self._candidates[key]
+        first = self.first
+        keep = np.ones(len(first), dtype=bool)
+        if media:
+            keep &= first['Media'].isin(media).to_numpy()
+        if year:
+            years = first['startYear'].to_numpy()
+            keep &= (years >= year[0]) & (years <= year[1])
+        ids = pd.unique(first['title'].to_numpy()[keep])
+        with self._lock:
+            self._candidates[key] = ids
+            while len(self._candidates) > self.maxsize:
+                self._candidates.popitem(last=False)
+        return ids
+
+    def prefix(self, query):
+        lo = bisect_left(self.sorted_lower, query)
+        hi = bisect_right(self.sorted_lower, query + '\U0010ffff')
+        return self.by_name[lo:hi]
+
+    def substring(self, query):
+        positions = np.fromiter((hit.start() for hit in re.finditer(re.escape(query), self.haystack)), dtype=np.intp)
+        return np.unique(np.searchsorted(self.starts, positions, side='right') - 1)
+
+    # the first (up to limit) titles a media/year selection leaves which contain query
+    # (case-insensitive), plus how many there are in all
+    def search(self, media, year, query=None, limit=None):
+        limit = self.limit if limit is None else limit
+        ids = self.candidates(media, year)
+        query = (query or '').strip().lower().replace('\n', ' ')
+        if query:
+            is_prefix = np.zeros(len(self.titles), dtype=bool)
+            is_prefix[self.prefix(query)] = True
+            is_match = np.zeros(len(self.titles), dtype=bool)
+            is_match[self.substring(query)] = True
+            ids = np.concatenate([ids[is_prefix[ids]], ids[is_match[ids] & ~is_prefix[ids]]])
+        return self.titles[ids[:limit]].tolist(), len(ids)
+
+    # dropdown options: the first matches, the selected titles (which the dropdown needs
+    # to keep showing them), and a note when the list was cut short
+    def options(self, media, year, query=None, selected=None):
+        titles, total = self.search(media, year, query)
+        options = [{'label': title, 'value': title} for title in titles]
+        shown = set(titles)
+        options += [{'label': title, 'value': title} for title in selected or [] if title not in shown]
+        if total > len(titles):
+            options.append({
+                'label': '{} more titles, type to narrow the list'.format(total - len(titles)),
+                'value': '__more__',
+                'search': query or '', # so the dropdown's own filtering keeps it visible
+                'disabled': True
+            })
+        return options